@@ -13,18 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys
+import requests, httpclient, sys
 from config import *
 
-if not TODOIST_ACCESS_TOKEN:
-    logging.error("TODOIST_ACCESS_TOKEN not set in config.py")
-    sys.exit(1)
-
 points = []
 
 def get_project(project_id):
 	try:
-		response = requests.get(f'https://api.todoist.com/sync/v9/projects/get', 
+		response = httpclient.get(f'https://api.todoist.com/sync/v9/projects/get', 
 			params={'project_id': project_id},
 			headers={'Authorization': f'Bearer {TODOIST_ACCESS_TOKEN}'})
 		response.raise_for_status()
@@ -41,7 +37,7 @@ def get_activity(page):
 	while count == -1 or len(events) < count:
 		logging.debug("Fetching page %s offset %s", page, len(events))
 		try:
-			response = requests.get(f'https://api.todoist.com/sync/v9/activity/get', 
+			response = httpclient.get(f'https://api.todoist.com/sync/v9/activity/get', 
 				params={'page': page, 'offset': offset, 'limit': 100},
 				headers={'Authorization': f'Bearer {TODOIST_ACCESS_TOKEN}'})
 			response.raise_for_status()
@@ -57,36 +53,47 @@ def get_activity(page):
 
 	return events
 
-connect(TODOIST_DATABASE)
+def main():
+	global points
+	if not TODOIST_ACCESS_TOKEN:
+		logging.error("TODOIST_ACCESS_TOKEN not set in config.py")
+		sys.exit(1)
+
+	points = []
+	connect(TODOIST_DATABASE)
+
+	page = 0
+	activity = get_activity(page)
+	projects = {}
+	for event in activity:
+		if event['object_type'] == 'item':
+			if event['event_type'] == 'added' or event['event_type'] == 'completed':
+				project = None
+				try:
+					if event['parent_project_id'] in projects:
+						project = projects[event['parent_project_id']]
+					else:
+						project = get_project(event['parent_project_id'])
+						projects[event['parent_project_id']] = project
+				except AttributeError as err:
+					logging.warning("Unable to fetch name for project ID %s", event['parent_project_id'])
+
+				if project != None:
+					points.append({
+						"measurement": event['event_type'],
+						"time": event['event_date'],
+						"tags": {
+							"item_id": event['id'],
+							"project_id": event['parent_project_id'],
+							"project_name": project['project']['name'],
+						},
+						"fields": {
+							"content": event['extra_data']['content']
+						}
+					})
 
-page = 0
-activity = get_activity(page)
-projects = {}
-for event in activity:
-	if event['object_type'] == 'item':
-		if event['event_type'] == 'added' or event['event_type'] == 'completed':
-			project = None
-			try:
-				if event['parent_project_id'] in projects:
-					project = projects[event['parent_project_id']]
-				else:
-					project = get_project(event['parent_project_id'])
-					projects[event['parent_project_id']] = project
-			except AttributeError as err:
-				logging.warning("Unable to fetch name for project ID %s", event['parent_project_id'])
+	write_points(points)
 
-			if project != None:
-				points.append({
-					"measurement": event['event_type'],
-					"time": event['event_date'],
-					"tags": {
-						"item_id": event['id'],
-						"project_id": event['parent_project_id'],
-						"project_name": project['project']['name'],
-					},
-					"fields": {
-						"content": event['extra_data']['content']
-					}
-				})
 
-write_points(points)
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, json, pickle, threading
+from collections import OrderedDict
+import publicsuffix2
+
+
+class ActivityClassifier:
+    """Decides which RescueTime activities are games.
+
+    An activity counts as a game unless it is a website (it has a public
+    suffix) or one of the excluded applications like launchers and VR
+    runtimes. Verdicts are kept in a persisted LRU cache of max_entries
+    activities, so the public suffix list is only consulted for activities
+    that haven't been seen before. The parsed list itself is pickled next to
+    the cache, which loads much faster than parsing it again.
+    """
+
+    def __init__(self, path, excluded=(), max_entries=10000):
+        self.path = path
+        self.excluded = {activity.lower() for activity in excluded}
+        self.max_entries = max_entries
+        self._psl = None
+        self._changed = False
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                self._verdicts = OrderedDict(json.load(f))
+        except (FileNotFoundError, ValueError):
+            self._verdicts = OrderedDict()
+
+    def _public_suffix_list(self):
+        if self._psl is not None:
+            return self._psl
+
+        path = self.path + '.psl'
+        try:
+            # The pickle is stale once publicsuffix2 (and the list it bundles) is upgraded
+            if os.path.getmtime(path) > os.path.getmtime(publicsuffix2.__file__):
+                with open(path, 'rb') as f:
+                    self._psl = pickle.load(f)
+                return self._psl
+        except (OSError, pickle.UnpicklingError, EOFError):
+            pass
+
+        self._psl = publicsuffix2.PublicSuffixList()
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(self._psl, f)
+        os.replace(path + '.tmp', path)
+        return self._psl
+
+    def is_website(self, activity):
+        return self._public_suffix_list().get_public_suffix(activity, strict=True) is not None
+
+    def is_game(self, activity):
+        if activity.lower() in self.excluded:
+            return False
+
+        with self._lock:
+            verdict = self._verdicts.get(activity)
+            if verdict is not None:
+                self._verdicts.move_to_end(activity)
+                return verdict
+
+        verdict = not self.is_website(activity)
+        with self._lock:
+            self._verdicts[activity] = verdict
+            if len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+            self._changed = True
+        return verdict
+
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(list(self._verdicts.items()), f)
+            os.replace(self.path + '.tmp', self.path)
+            self._changed = False
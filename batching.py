@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+class AdaptiveBatcher:
+    """Sizes write batches by encoded bytes and observed write latency.
+
+    The number of points per batch doubles while InfluxDB answers faster than
+    target_latency, and is halved when a write is slow, times out or is
+    rejected as too large. Batches never exceed max_points or max_bytes.
+    """
+
+    def __init__(self, initial_points=50, max_points=5000, max_bytes=1048576, target_latency=1.0):
+        self.max_points = max(int(max_points), 1)
+        self.max_bytes = max(int(max_bytes), 1)
+        self.target_latency = float(target_latency)
+        self.points = min(max(int(initial_points), 1), self.max_points)
+
+    def take(self, lines, start, stop):
+        """Returns the end index of the next batch of lines[start:stop]"""
+        limit = min(stop, start + self.points)
+        end = start
+        size = 0
+        while end < limit:
+            # max_bytes is what goes over the wire, so count UTF-8 bytes (isascii() is a cheap flag check)
+            line = lines[end]
+            size += (len(line) if line.isascii() else len(line.encode('utf-8'))) + 1
+            if size > self.max_bytes and end > start:
+                break
+            end += 1
+
+        return end
+
+    def record(self, count, elapsed):
+        if elapsed > self.target_latency * 2:
+            self.shrink()
+        elif elapsed < self.target_latency and count >= self.points:
+            self.points = min(self.points * 2, self.max_points)
+
+    def shrink(self):
+        self.points = max(self.points // 2, 1)
@@ -13,9 +13,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os, sys, logging, colorlog, pytz
+import os, sys, logging, colorlog, pytz, requests, threading, json, queue
+from datetime import datetime as _datetime
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from time import monotonic
+from copy import copy as _copy
 from influxdb import InfluxDBClient
-from influxdb.exceptions import InfluxDBClientError
+from influxdb.exceptions import InfluxDBClientError, InfluxDBServerError
+from lineprotocol import LineSerializer
+from batching import AdaptiveBatcher
+from spool import Spool
+from state import StateStore
+from dedup import DedupIndex
 
 LOCAL_TIMEZONE = pytz.timezone('Europe/Amsterdam')
 
@@ -31,15 +41,63 @@ INFLUXDB_HOST = os.environ.get('INFLUXDB_HOST', 'localhost')
 INFLUXDB_PORT = os.environ.get('INFLUXDB_PORT', 8086)
 INFLUXDB_USERNAME = os.environ.get('INFLUXDB_USERNAME', '')
 INFLUXDB_PASSWORD = os.environ.get('INFLUXDB_PASSWORD', '')
-INFLUXDB_CHUNK_SIZE = os.environ.get('INFLUXDB_CHUNK_SIZE', 50) # How many points to send per request
+INFLUXDB_CHUNK_SIZE = int(os.environ.get('INFLUXDB_CHUNK_SIZE', 50)) # How many points to send in the first request, later batches adapt to write latency
+INFLUXDB_MAX_CHUNK_SIZE = int(os.environ.get('INFLUXDB_MAX_CHUNK_SIZE', 5000)) # Upper bound on points per request
+INFLUXDB_MAX_CHUNK_BYTES = int(os.environ.get('INFLUXDB_MAX_CHUNK_BYTES', 1048576)) # Upper bound on uncompressed bytes per request
+INFLUXDB_TARGET_LATENCY = float(os.environ.get('INFLUXDB_TARGET_LATENCY', 1.0)) # Batches grow while writes are faster than this many seconds
+INFLUXDB_TIMEOUT = float(os.environ.get('INFLUXDB_TIMEOUT', 30))
+INFLUXDB_SPOOL = _is_env_true(os.environ.get('INFLUXDB_SPOOL', False)) # Write points to a local spool first and drain it to InfluxDB in the background
+INFLUXDB_SPOOL_DIR = os.environ.get('INFLUXDB_SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.influxdb-spool'))
+INFLUXDB_QUARANTINE_FILE = os.environ.get('INFLUXDB_QUARANTINE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.influxdb-quarantine')) # Points rejected by InfluxDB are saved here
+INFLUXDB_WRITE_CONCURRENCY = int(os.environ.get('INFLUXDB_WRITE_CONCURRENCY', 4)) # How many write requests to keep in flight, 1 writes chunks sequentially
+INFLUXDB_GZIP = _is_env_true(os.environ.get('INFLUXDB_GZIP', True))
+INFLUXDB_STREAM_BUFFER = int(os.environ.get('INFLUXDB_STREAM_BUFFER', 10000)) # Points a collector can get ahead of the writer when streaming
+INFLUXDB_STREAM_FLUSH_SIZE = int(os.environ.get('INFLUXDB_STREAM_FLUSH_SIZE', 5000)) # Streamed points are written once this many are buffered...
+INFLUXDB_STREAM_INTERVAL = float(os.environ.get('INFLUXDB_STREAM_INTERVAL', 5)) # ...or this many seconds have passed
+INFLUXDB_DEDUP = _is_env_true(os.environ.get('INFLUXDB_DEDUP', True)) # Skip points that were already written with the same field values
+INFLUXDB_DEDUP_FILE = os.environ.get('INFLUXDB_DEDUP_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.influxdb-dedup.sqlite'))
+INFLUXDB_DEDUP_MAX_AGE = int(os.environ.get('INFLUXDB_DEDUP_MAX_AGE', 30 * 86400)) # Unchanged points are written again after this many seconds
+
+# HTTP configuration shared by all collectors
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 10))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 60))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 5)) # Retries on connection errors and 429/5xx responses
+HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF', 1.0)) # Exponential backoff factor in seconds, randomized with jitter
+HTTP_POOL_HOSTS = int(os.environ.get('HTTP_POOL_HOSTS', 20)) # How many hosts to keep connection pools for
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10)) # Keep-alive connections per host
+HTTP_CACHE_FILE = os.environ.get('HTTP_CACHE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.http-cache.sqlite'))
+HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 67108864))
+# GET responses from URLs matching these patterns are cached for the given number of seconds, then revalidated
+# with ETag / Last-Modified. Anything else, like live feeds and jump logs, always goes to the network.
+HTTP_CACHE_RULES = [
+    (r'^https://api\.themoviedb\.org/3/', 7 * 86400),
+    (r'^https://api\.steampowered\.com/ISteamUserStats/GetSchemaForGame/', 7 * 86400),
+    (r'^https://www\.exophase\.com/game/', 86400),
+]
+
+# Collectors save how far they got here and only fetch newer data on the next run, pass --full to fetch everything again
+STATE_FILE = os.environ.get('STATE_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.state.json'))
+
+# Daemon configuration, see daemon.py
+DAEMON_SCHEDULE = os.environ.get('DAEMON_SCHEDULE', 'librelinkup=300,rescuetime=3600,github=86400') # Comma separated collector=interval in seconds
+DAEMON_MAX_CONCURRENT = int(os.environ.get('DAEMON_MAX_CONCURRENT', 4)) # How many collectors may run at the same time
+DAEMON_JITTER = float(os.environ.get('DAEMON_JITTER', 60)) # Up to this many seconds are added to each interval to spread out runs
 
 # Shared gaming database
 GAMING_DATABASE = os.environ.get('GAMING_DATABASE', 'gaming')
 
+# Google Play Games configuration
+GOOGLE_PLAY_TAKEOUT = os.environ.get('GOOGLE_PLAY_TAKEOUT', '') # Takeout .zip / .tgz archives to read, may be a glob like /data/takeout-*.zip
+GOOGLE_PLAY_PROCESSES = int(os.environ.get('GOOGLE_PLAY_PROCESSES', 0)) # Processes parsing Takeout pages, 0 to use every core
+
 # EDSM configuration
 EDSM_API_KEY = os.environ.get('EDSM_API_KEY', '')
 EDSM_COMMANDER_NAME = os.environ.get('EDSM_COMMANDER_NAME', '')
 EDSM_DATABASE = os.environ.get('EDSM_DATABASE', 'edsm')
+EDSM_SYSTEMS_FILE = os.environ.get('EDSM_SYSTEMS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.edsm-systems.sqlite')) # Star system coordinates looked up on EDSM
+EDSM_SYSTEMS_BATCH_SIZE = int(os.environ.get('EDSM_SYSTEMS_BATCH_SIZE', 50)) # Systems to look up per request
+EDSM_CONCURRENCY = int(os.environ.get('EDSM_CONCURRENCY', 4)) # Jump log windows to fetch at the same time, requests are still spaced to fit EDSM's rate limit
+EDSM_BACKFILL_START = os.environ.get('EDSM_BACKFILL_START', '2014-12-16 00:00:00') # How far back edsm.py --backfill goes
 
 # Exist.io configuration
 EXIST_ACCESS_TOKEN = os.environ.get('EXIST_ACCESS_TOKEN', '')
@@ -49,6 +107,9 @@ EXIST_USE_FITBIT = _is_env_true(os.environ.get('EXIST_USE_FITBIT', True))
 EXIST_USE_TRAKT = _is_env_true(os.environ.get('EXIST_USE_TRAKT', True))
 EXIST_USE_GAMING = _is_env_true(os.environ.get('EXIST_USE_GAMING', True))
 EXIST_USE_RESCUETIME = _is_env_true(os.environ.get('EXIST_USE_RESCUETIME', False))
+EXIST_BATCH_SIZE = int(os.environ.get('EXIST_BATCH_SIZE', 35)) # Most attributes or tags exist.io accepts per request
+EXIST_CONCURRENCY = int(os.environ.get('EXIST_CONCURRENCY', 4))
+EXIST_RETRIES = int(os.environ.get('EXIST_RETRIES', 2)) # How many times to send items exist.io rejected again
 
 # Fitbit configuration
 FITBIT_LANGUAGE = os.environ.get('FITBIT_LANGUAGE', 'en_US')
@@ -76,7 +137,8 @@ GITHUB_DATABASE = os.environ.get('GITHUB_DATABASE', 'github')
 # Instagram configuration
 INSTAGRAM_PROFILE = os.environ.get('INSTAGRAM_PROFILE', '')
 INSTAGRAM_DATABASE = os.environ.get('INSTAGRAM_DATABASE', 'instagram')
-INSTAGRAM_MAX_POSTS = os.environ.get('INSTAGRAM_MAX_POSTS', 10) #set to 0 to download all posts
+INSTAGRAM_MAX_POSTS = int(os.environ.get('INSTAGRAM_MAX_POSTS', 10)) #set to 0 to download all posts
+INSTAGRAM_REFRESH_POSTS = int(os.environ.get('INSTAGRAM_REFRESH_POSTS', 5)) # How many recent posts to fetch again for new likes and comments
 
 # Freestyle LibreLinkUp configuration
 LIBRELINKUP_USERNAME = os.environ.get('LIBRELINKUP_USERNAME', '')
@@ -106,6 +168,11 @@ ONETOUCH_DATABASE = os.environ.get('ONETOUCH_DATABASE', 'glucose')
 # RescueTime configuration
 RESCUETIME_API_KEY = os.environ.get('RESCUETIME_API_KEY', '')
 RESCUETIME_DATABASE = os.environ.get('RESCUETIME_DATABASE', 'rescuetime')
+# Applications in RescueTime's Games category that aren't games
+RESCUETIME_EXCLUDED_ACTIVITIES = [activity.strip() for activity in os.environ.get('RESCUETIME_EXCLUDED_ACTIVITIES',
+    'Steam,steamwebhelper,origin,mixedrealityportal,holoshellapp,vrmonitor,vrserver,oculusclient,vive,obs64').split(',') if activity.strip()]
+RESCUETIME_ACTIVITY_CACHE = os.environ.get('RESCUETIME_ACTIVITY_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.rescuetime-activities.json'))
+RESCUETIME_GAMES_FILE = os.environ.get('RESCUETIME_GAMES_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rescuetime-games.json')) # RescueTime activities that rescuetime-games.py records as games
 
 # RetroAchievements configuration
 RA_API_KEY = os.environ.get('RA_API_KEY', '')
@@ -119,6 +186,7 @@ RETROARCH_IMAGE_WEB_PREFIX = os.environ.get('RETROARCH_IMAGE_WEB_PREFIX', 'https
 
 # Exophase configuration for Stadia and PSN
 EXOPHASE_NAME = os.environ.get('EXOPHASE_NAME', '')
+EXOPHASE_CONCURRENCY = int(os.environ.get('EXOPHASE_CONCURRENCY', 2)) # Requests to Exophase at the same time, across all Exophase collectors
 
 # Stadia configuration
 STADIA_NAME = os.environ.get('STADIA_NAME', '')
@@ -127,6 +195,7 @@ STADIA_DATABASE = os.environ.get('STADIA_DATABASE', GAMING_DATABASE)
 # PSN configuration
 PSN_NAME = os.environ.get('PSN_NAME', '')
 PSN_DATABASE = os.environ.get('PSN_DATABASE', GAMING_DATABASE)
+PSN_TROPHY_CACHE = os.environ.get('PSN_TROPHY_CACHE', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.psn-trophies.json')) # Trophy descriptions by award id
 
 # Steam configuration
 STEAM_API_KEY = os.environ.get('STEAM_API_KEY', '')
@@ -134,6 +203,7 @@ STEAM_ID = os.environ.get('STEAM_ID', '')
 STEAM_USERNAME = os.environ.get('STEAM_USERNAME', '')
 STEAM_LANGUAGE = os.environ.get('STEAM_LANGUAGE', 'en')
 STEAM_DATABASE = os.environ.get('STEAM_DATABASE', GAMING_DATABASE)
+STEAM_CONCURRENCY = int(os.environ.get('STEAM_CONCURRENCY', 4)) # Games to fetch achievements for at the same time
 
 # Todoist configuration
 TODOIST_ACCESS_TOKEN = os.environ.get('TODOIST_ACCESS_TOKEN', '')
@@ -161,40 +231,382 @@ LOG_COLORS = {
     'CRITICAL': 'red',
 }
 
+WRITE_ERRORS = (InfluxDBClientError, InfluxDBServerError, requests.exceptions.RequestException)
+
+def _new_client():
+    """A client with its own current database that shares the connection pool of every other client.
+
+    Each InfluxDBClient mounts a new adapter on the session it is given,
+    dropping the pooled keep-alive connections while other threads use them,
+    so only the first one is constructed and the rest are copies of it.
+    """
+    global base_client
+    with base_client_lock:
+        if base_client is None:
+            base_client = InfluxDBClient(host=INFLUXDB_HOST, port=INFLUXDB_PORT, username=INFLUXDB_USERNAME, password=INFLUXDB_PASSWORD,
+                timeout=INFLUXDB_TIMEOUT, gzip=INFLUXDB_GZIP, pool_size=max(INFLUXDB_WRITE_CONCURRENCY, 1), session=influxdb_session)
+    return _copy(base_client)
+
+def current_client():
+    """The client from the last connect() on this thread, daemon.py runs each collector on its own thread"""
+    return getattr(local, 'client', None) or client
+
 def connect(db):
     global client
     try:
         logging.info("Connecting to %s:%s", INFLUXDB_HOST, INFLUXDB_PORT)
-        client = InfluxDBClient(host=INFLUXDB_HOST, port=INFLUXDB_PORT, username=INFLUXDB_USERNAME, password=INFLUXDB_PASSWORD)
-        client.create_database(db)
+        client = local.client = getattr(local, 'client', None) or _new_client()
         client.switch_database(db)
-    except InfluxDBClientError as err:
-        logging.error("InfluxDB connection failed: %s", err)
-        sys.exit(1)
+        with databases_lock:
+            if db not in created_databases:
+                client.create_database(db)
+                created_databases.add(db)
+    except WRITE_ERRORS as err:
+        if not INFLUXDB_SPOOL:
+            logging.error("InfluxDB connection failed: %s", err)
+            sys.exit(1)
+        logging.warning("InfluxDB connection failed, points will be kept in the spool: %s", err)
     return client
 
-def write_points(points):
-    total = len(points)
-    global client
+def _write_chunk(db_client, chunk, precision, database):
+    start = monotonic()
+    db_client.write_points(chunk, time_precision=precision, database=database, protocol='line')
+    return monotonic() - start
+
+def _submit(executor, *args):
+    if executor is not None:
+        return executor.submit(_write_chunk, *args)
+
+    # Without an executor (e.g. on the background drain thread, where new
+    # executors can't be started once the main thread exits) write inline
+    future = Future()
+    try:
+        future.set_result(_write_chunk(*args))
+    except Exception as err:
+        future.set_exception(err)
+    return future
+
+def _is_too_large(err):
+    return isinstance(err, requests.exceptions.Timeout) or getattr(err, 'code', None) == 413
+
+def _is_rejected(err):
+    return isinstance(err, InfluxDBClientError) and err.code == 400
+
+def quarantine(database, precision, line, err):
+    logging.warning("Quarantined point that can't be written: %s", err)
+    with quarantine_lock, open(INFLUXDB_QUARANTINE_FILE, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({
+            "time": _datetime.utcnow().isoformat(),
+            "db": database,
+            "precision": precision,
+            "line": line,
+            "error": str(err)
+        }) + '\n')
+
+def _write_batches(db_client, batches, database=None, concurrency=INFLUXDB_WRITE_CONCURRENCY):
+    total = sum(len(lines) for lines in batches.values())
+    concurrency = max(concurrency, 1)
+    pending = deque((precision, lines, 0, len(lines)) for precision, lines in batches.items())
+    in_flight = {}
+    written = 0
+    failed = 0
+    rejected = set()
+    executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
     try:
-        start = 0
-        end = INFLUXDB_CHUNK_SIZE
-        while start < len(points):
-            if end > len(points):
-                end = len(points)
-
-            client.write_points(points[start:end])
-            logging.debug(f"Wrote {end} / {total} points")
-
-            start = end
-            end = end + INFLUXDB_CHUNK_SIZE
-    except InfluxDBClientError as err:
-        logging.error("Unable to write points to InfluxDB: %s", err)
+        while pending or in_flight:
+            while pending and len(in_flight) < concurrency:
+                precision, lines, start, stop = pending.popleft()
+                end = batcher.take(lines, start, stop)
+                if end < stop:
+                    pending.appendleft((precision, lines, end, stop))
+                chunk = lines[start:end]
+                in_flight[_submit(executor, db_client, chunk, precision, database)] = (precision, chunk)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                precision, chunk = in_flight.pop(future)
+                try:
+                    batcher.record(len(chunk), future.result())
+                    written += len(chunk)
+                    logging.debug(f"Wrote {written} / {total} points ({len(chunk)} per request)")
+                except WRITE_ERRORS as err:
+                    if (_is_too_large(err) or _is_rejected(err)) and len(chunk) > 1:
+                        # Split the chunk in half until the bad points are isolated, the good ones still get written
+                        if _is_too_large(err):
+                            batcher.shrink()
+                            logging.warning("Retrying %s points in smaller batches: %s", len(chunk), err)
+                        else:
+                            logging.warning("InfluxDB rejected %s points, splitting them to find the bad ones: %s", len(chunk), err)
+                        half = len(chunk) // 2
+                        pending.appendleft((precision, chunk, half, len(chunk)))
+                        pending.appendleft((precision, chunk, 0, half))
+                    elif _is_rejected(err):
+                        quarantine(database or db_client._database, precision, chunk[0], err)
+                        rejected.add(chunk[0])
+                    else:
+                        failed += len(chunk)
+                        logging.error("Unable to write %s points to InfluxDB: %s", len(chunk), err)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    return failed, rejected
+
+def _record_written(batches, digests, rejected):
+    """Remember the points InfluxDB accepted, digests holds the digest (or None) of each line in batches"""
+    if _dedup() is None:
+        return
+    dedup.record(digest for precision, lines in batches.items()
+        for line, digest in zip(lines, digests.get(precision, ())) if digest is not None and line not in rejected)
+
+def _dedup():
+    """The dedup index, opened on first use so importing config doesn't create it"""
+    global dedup
+    if INFLUXDB_DEDUP and dedup is None:
+        with dedup_lock:
+            if dedup is None:
+                dedup = DedupIndex(INFLUXDB_DEDUP_FILE, INFLUXDB_DEDUP_MAX_AGE)
+    return dedup
+
+def _drop_unchanged(database, points):
+    """Serialize points, leaving out the ones already written with the same field values"""
+    encoded = []
+    for point in points:
+        precision, series, fields, timestamp = serializer.encode(point)
+        digest = dedup.digest(database, precision, series, timestamp, fields) if timestamp is not None else None
+        encoded.append((precision, series, fields, timestamp, digest))
+
+    # With --full everything is written again, but the index is still updated
+    unchanged = set() if state.full else dedup.unchanged(entry[4] for entry in encoded if entry[4] is not None)
+    batches = {}
+    digests = {}
+    for precision, line, fields, timestamp, digest in encoded:
+        if digest is not None and digest[0] in unchanged:
+            continue
+        if fields:
+            line += ' ' + fields
+        if timestamp is not None:
+            line += ' ' + timestamp
+        batches.setdefault(precision, []).append(line)
+        digests.setdefault(precision, []).append(digest)
+
+    return batches, digests
+
+def _flush(db_client, points):
+    """Write a list of points, returns (written, skipped, quarantined, failed) counts"""
+    if _dedup() is not None:
+        batches, digests = _drop_unchanged(db_client._database, points)
+    else:
+        batches, digests = serializer.serialize_points(points), {}
+    total = sum(len(lines) for lines in batches.values())
+    skipped = len(points) - total
+    if total == 0:
+        return 0, skipped, 0, 0
+
+    if INFLUXDB_SPOOL:
+        # The digests travel with the spooled lines and are only recorded once the drain has written them
+        for precision, lines in batches.items():
+            spool.append(db_client._database, precision, lines, digests.get(precision))
+        _start_drain()
+        return total, skipped, 0, 0
+
+    failed, rejected = _write_batches(db_client, batches)
+    if failed > 0:
+        return 0, skipped, len(rejected), failed
+    _record_written(batches, digests, rejected)
+    return total - len(rejected), skipped, len(rejected), 0
+
+def _stream(db_client, points):
+    """Write points from an iterable as they are produced, through a bounded buffer drained by a writer thread"""
+    buffer = queue.Queue(maxsize=INFLUXDB_STREAM_BUFFER)
+    totals = [0, 0, 0, 0]
+    errors = []
+    stopped = threading.Event()
+
+    def writer():
+        batch = []
+        deadline = monotonic() + INFLUXDB_STREAM_INTERVAL
+        try:
+            while True:
+                try:
+                    point = buffer.get(timeout=max(deadline - monotonic(), 0))
+                except queue.Empty:
+                    point = None
+
+                if point is not None and point is not _END:
+                    batch.append(point)
+                    if len(batch) < INFLUXDB_STREAM_FLUSH_SIZE and monotonic() < deadline:
+                        continue
+
+                if batch:
+                    result = _flush(db_client, batch)
+                    for i, count in enumerate(result):
+                        totals[i] += count
+                    batch = []
+                    if result[3] > 0:
+                        return
+                if point is _END:
+                    return
+                deadline = monotonic() + INFLUXDB_STREAM_INTERVAL
+        except BaseException as err:
+            errors.append(err)
+        finally:
+            stopped.set()
+
+    def put(point):
+        while not stopped.is_set():
+            try:
+                buffer.put(point, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    thread = threading.Thread(target=writer, name='influxdb-writer')
+    thread.start()
+    try:
+        for point in points:
+            if stopped.is_set():
+                break
+            put(point)
+    finally:
+        put(_END)
+        thread.join()
+
+    if errors:
+        raise errors[0]
+    return tuple(totals)
+
+def write_points(points):
+    """Write a list of points in one go, or stream them in batches from any other iterable such as a generator"""
+    db_client = current_client()
+    if isinstance(points, list):
+        written, skipped, quarantined, failed = _flush(db_client, points)
+    else:
+        written, skipped, quarantined, failed = _stream(db_client, points)
+
+    if skipped > 0:
+        logging.info("Skipped %s unchanged data points", skipped)
+    if failed > 0:
+        logging.error("Failed to write %s data points to InfluxDB", failed)
         sys.exit(1)
 
-    logging.info("Successfully wrote %s data points to InfluxDB", total)
+    if quarantined > 0:
+        logging.warning("%s data points were rejected by InfluxDB and saved to %s", quarantined, INFLUXDB_QUARANTINE_FILE)
+    if INFLUXDB_SPOOL:
+        logging.info("Spooled %s data points", written)
+    else:
+        logging.info("Successfully wrote %s data points to InfluxDB", written)
+
+def drain_spool(concurrency=INFLUXDB_WRITE_CONCURRENCY):
+    """Replay spooled points to InfluxDB in batches, returns False if some points are still waiting"""
+    global spool
+    if spool is None:
+        spool = Spool(INFLUXDB_SPOOL_DIR)
 
+    lock = spool.lock_drain()
+    if lock is None:
+        logging.info("Spool is already being drained by another process")
+        return True
+
+    try:
+        db_client = _new_client()
+        databases = set()
+        batch_lines = []
+        batch_digests = []
+        batch_key = None
+        offsets = {}
+        drained = 0
+
+        def flush():
+            if batch_lines:
+                database, precision = batch_key
+                if database not in databases:
+                    db_client.create_database(database)
+                    databases.add(database)
+                failed, rejected = _write_batches(db_client, {precision: batch_lines}, database, concurrency)
+                if failed > 0:
+                    return False
+            for segment, offset in offsets.items():
+                spool.ack(segment, offset)
+            if batch_lines:
+                _record_written({precision: batch_lines}, {precision: batch_digests}, rejected)
+            return True
+
+        try:
+            for segment, offset, record in spool.replay():
+                if 'corrupt' in record:
+                    quarantine(None, None, record['corrupt'], "Corrupt spool record in " + segment)
+                    offsets[segment] = offset
+                    continue
+                key = (record['db'], record['precision'])
+                if batch_lines and (key != batch_key or len(batch_lines) >= INFLUXDB_MAX_CHUNK_SIZE * max(INFLUXDB_WRITE_CONCURRENCY, 1)):
+                    if not flush():
+                        return False
+                    drained += len(batch_lines)
+                    batch_lines = []
+                    batch_digests = []
+                    offsets = {}
+                batch_key = key
+                batch_lines.extend(record['lines'])
+                batch_digests.extend(record.get('digests') or [None] * len(record['lines']))
+                offsets[segment] = offset
+
+            if offsets:
+                if not flush():
+                    return False
+                drained += len(batch_lines)
+        except WRITE_ERRORS as err:
+            logging.error("Unable to drain spool to InfluxDB: %s", err)
+            return False
+        finally:
+            spool.compact()
+
+        if drained > 0:
+            logging.info("Successfully wrote %s spooled data points to InfluxDB", drained)
+        return True
+    finally:
+        lock.close()
+
+def _drain_in_background():
+    global drain_thread
+    while True:
+        with drain_lock:
+            if not drain_pending.is_set():
+                drain_thread = None
+                return
+            drain_pending.clear()
+        if not drain_spool(concurrency=1):
+            logging.warning("InfluxDB is unavailable, spooled points will be written on the next run or by drain.py")
+            with drain_lock:
+                drain_thread = None
+                return
+
+def _start_drain():
+    global drain_thread
+    with drain_lock:
+        drain_pending.set()
+        if drain_thread is None:
+            drain_thread = threading.Thread(target=_drain_in_background, name='spool-drain')
+            drain_thread.start()
+
+_END = object()
 client = None
+base_client = None
+base_client_lock = threading.Lock()
+local = threading.local()
+created_databases = set()
+databases_lock = threading.Lock()
+influxdb_session = requests.Session()
+serializer = LineSerializer()
+spool = Spool(INFLUXDB_SPOOL_DIR) if INFLUXDB_SPOOL else None
+quarantine_lock = threading.Lock()
+drain_thread = None
+drain_lock = threading.Lock()
+drain_pending = threading.Event()
+dedup = None
+dedup_lock = threading.Lock()
+state = StateStore(STATE_FILE, full='--full' in sys.argv[1:])
+batcher = AdaptiveBatcher(INFLUXDB_CHUNK_SIZE, INFLUXDB_MAX_CHUNK_SIZE, INFLUXDB_MAX_CHUNK_BYTES, INFLUXDB_TARGET_LATENCY)
 
 if sys.stdout.isatty():
     colorlog.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT, log_colors=LOG_COLORS, stream=sys.stdout)
@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys, random, signal, importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+from config import *
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def parse_schedule(schedule):
+    intervals = {}
+    for entry in schedule.split(','):
+        if not entry.strip():
+            continue
+        name, _, interval = entry.partition('=')
+        try:
+            intervals[name.strip()] = float(interval)
+        except ValueError:
+            logging.error("Invalid DAEMON_SCHEDULE entry: %s", entry)
+            sys.exit(1)
+    return intervals
+
+def load_collector(name):
+    path = os.path.join(SCRIPT_DIR, name + '.py')
+    if not os.path.isfile(path):
+        logging.error("Collector %s not found", path)
+        sys.exit(1)
+
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not hasattr(module, 'main'):
+        logging.error("Collector %s has no main()", name)
+        sys.exit(1)
+    return module
+
+def run_collector(name, module):
+    logging.info("Running %s", name)
+    start = monotonic()
+    try:
+        module.main()
+    except SystemExit as err:
+        if err.code not in (None, 0):
+            logging.error("%s exited with status %s", name, err.code)
+            return
+    except Exception:
+        logging.exception("%s failed", name)
+        return
+    logging.info("%s finished in %.1fs", name, monotonic() - start)
+
+def main():
+    intervals = parse_schedule(DAEMON_SCHEDULE)
+    if len(intervals) == 0:
+        logging.error("DAEMON_SCHEDULE not set in config.py")
+        sys.exit(1)
+
+    collectors = {name: load_collector(name) for name in intervals}
+    next_run = {name: monotonic() + random.uniform(0, DAEMON_JITTER) for name in intervals}
+    running = {}
+    logging.info("Scheduling %s", ', '.join(f'{name} every {interval:g}s' for name, interval in intervals.items()))
+
+    # Stop the same way on SIGTERM (e.g. from systemd or docker stop) as on Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    with ThreadPoolExecutor(max_workers=max(DAEMON_MAX_CONCURRENT, 1), thread_name_prefix='collector') as executor:
+        try:
+            while True:
+                now = monotonic()
+                for name, future in list(running.items()):
+                    if future.done():
+                        del running[name]
+
+                for name in sorted(next_run, key=next_run.get):
+                    if next_run[name] <= now and name not in running and len(running) < DAEMON_MAX_CONCURRENT:
+                        running[name] = executor.submit(run_collector, name, collectors[name])
+                        next_run[name] = now + intervals[name] + random.uniform(0, DAEMON_JITTER)
+
+                sleep(1)
+        except KeyboardInterrupt:
+            logging.info("Waiting for running collectors to finish")
+            executor.shutdown(cancel_futures=True)
+
+
+if __name__ == "__main__":
+    main()
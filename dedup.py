@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time, sqlite3, threading
+from hashlib import blake2b
+
+
+def _hash(value):
+    return int.from_bytes(blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big', signed=True)
+
+
+class DedupIndex:
+    """Remembers a hash of the field values of every point written to InfluxDB.
+
+    Points are keyed by a 64-bit hash of database, series and timestamp, so
+    the index stays small even for long histories. Entries expire max_age
+    seconds after they were written, after which an unchanged point is
+    written once more.
+    """
+
+    def __init__(self, path, max_age=2592000):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS points (
+            key INTEGER PRIMARY KEY,
+            hash INTEGER NOT NULL,
+            written_at REAL NOT NULL)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS points_written_at ON points (written_at)')
+
+    def digest(self, database, precision, series, timestamp, fields):
+        """Returns the (key, hash) pair identifying a point and its field values"""
+        return _hash(f'{database}\n{series}\n{precision}{timestamp}'), _hash(fields)
+
+    def unchanged(self, digests):
+        """Returns the keys of digests whose field values match what was last written"""
+        found = set()
+        digests = list(digests)
+        with self._lock:
+            for start in range(0, len(digests), 500):
+                chunk = dict(digests[start:start + 500])
+                rows = self._db.execute(f'SELECT key, hash FROM points WHERE key IN ({",".join("?" * len(chunk))})', list(chunk))
+                found.update(key for key, value in rows if chunk[key] == value)
+        return found
+
+    def record(self, digests):
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN')
+            try:
+                self._db.executemany('INSERT OR REPLACE INTO points VALUES (?, ?, ?)', ((key, value, now) for key, value in digests))
+                self._db.execute('DELETE FROM points WHERE written_at < ?', (now - self.max_age,))
+                self._db.execute('COMMIT')
+            except Exception:
+                self._db.execute('ROLLBACK')
+                raise
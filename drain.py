@@ -0,0 +1,24 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+from config import *
+
+if not os.path.isdir(INFLUXDB_SPOOL_DIR):
+    logging.info("Spool directory %s not found, nothing to drain", INFLUXDB_SPOOL_DIR)
+    sys.exit()
+
+if not drain_spool():
+    sys.exit(1)
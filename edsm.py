@@ -13,16 +13,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, requests_cache, sys, math, logging
-from datetime import datetime, date
+import requests, httpclient, sys, math, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+from time import sleep, monotonic
+from starsystems import SystemCache
 from config import *
 
-if not EDSM_API_KEY:
-    logging.error("EDSM_API_KEY not set in config.py")
-    sys.exit(1)
-
 points = []
+jumps = []
 last = None
+systems = {}
+system_cache = None
+next_request = 0
+request_interval = 0
+rate_limit_lock = threading.Lock()
 
 def add_rank(data, activity):
     global points
@@ -40,137 +45,216 @@ def add_rank(data, activity):
         }
     })
 
-def fetch_system(name):
+def fetch_systems(names):
+    """Look up systems in the in-process memo, then the system table, then in batches on EDSM"""
+    missing = list({name.lower(): name for name in names if name.lower() not in systems}.values())
+    if len(missing) == 0:
+        return
+
+    cached = system_cache.get_many(missing)
+    systems.update(cached)
+    missing = [name for name in missing if name.lower() not in cached]
+
+    for start in range(0, len(missing), EDSM_SYSTEMS_BATCH_SIZE):
+        batch = missing[start:start + EDSM_SYSTEMS_BATCH_SIZE]
+        try:
+            response = httpclient.get('https://www.edsm.net/api-v1/systems',
+                params={'systemName[]':batch, 'showCoordinates':1, 'showPrimaryStar':1, 'apiKey':EDSM_API_KEY})
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            logging.error("HTTP request failed: %s", err)
+            sys.exit(1)
+
+        systems.update(system_cache.put_many(response.json()))
+        logging.info("Got %s / %s systems from EDSM", min(start + EDSM_SYSTEMS_BATCH_SIZE, len(missing)), len(missing))
+
+def distance(s1, s2):
+    dx = s1['x'] - s2['x']
+    dy = s1['y'] - s2['y']
+    dz = s1['z'] - s2['z']
+
+    return math.sqrt(dx*dx + dy*dy + dz*dz)
+
+def add_jump(src, dst):
+    global points
+    system = systems.get(dst['system'].lower())
+    previous = systems.get(src['system'].lower())
+    if system is None or previous is None:
+        logging.warning("Skipping jump to %s, system coordinates not known to EDSM", dst['system'])
+        return
+
+    tags = {
+        "commander": EDSM_COMMANDER_NAME,
+        "system": dst['system'],
+        "firstDiscover": dst['firstDiscover']
+    }
+    if system['primary_star'] is not None:
+        tags['primaryStarType'] = system['primary_star']
+
+    points.append({
+        "measurement": "jump",
+        "time": datetime.fromisoformat(dst['date']).isoformat(),
+        "tags": tags,
+        "fields": {
+            "distance": distance(previous, system),
+            "x": system['x'],
+            "y": system['y'],
+            "z": system['z']
+        }
+    })
+
+def wait_for_rate_limit():
+    """Reserve the next request slot, spacing requests evenly over what is left of EDSM's rate limit"""
+    global next_request
+    with rate_limit_lock:
+        now = monotonic()
+        start = max(next_request, now)
+        next_request = start + request_interval
+    if start > now:
+        sleep(start - now)
+
+def update_rate_limit(response):
+    global request_interval
+    remaining = int(response.headers.get('X-Rate-Limit-Remaining', 0) or 0)
+    reset = int(response.headers.get('X-Rate-Limit-Reset', 0) or 0)
+    if remaining > 0 and reset > 0:
+        request_interval = reset / remaining
+
+def fetch_logs(start, end):
+    wait_for_rate_limit()
     try:
-        response = requests.get('https://www.edsm.net/api-v1/system',
-            params={'systemName':name, 'showCoordinates':1, 'showPrimaryStar':1, 'apiKey':EDSM_API_KEY})
+        response = httpclient.get('https://www.edsm.net/api-logs-v1/get-logs',
+            params={'commanderName':EDSM_COMMANDER_NAME, 'apiKey':EDSM_API_KEY,
+                'startDateTime':start.strftime('%Y-%m-%d %H:%M:%S'), 'endDateTime':end.strftime('%Y-%m-%d %H:%M:%S')})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         logging.error("HTTP request failed: %s", err)
         sys.exit(1)
+    update_rate_limit(response)
 
-    return response.json()
+    data = response.json()
+    if 'logs' not in data:
+        logging.error("Unable to fetch jumps from EDSM: %s", data.get('msg'))
+        sys.exit(1)
+    logging.debug("Got %s jumps from EDSM between %s and %s", len(data['logs'] or []), start, end)
 
-def distance(system1, system2):
-    s1 = fetch_system(system1)
-    s2 = fetch_system(system2)
+    return sorted(data['logs'] or [], key=lambda jump: jump['date'], reverse=True)
 
-    dx = float(s1['coords']['x']) - float(s2['coords']['x'])
-    dy = float(s1['coords']['y']) - float(s2['coords']['y'])
-    dz = float(s1['coords']['z']) - float(s2['coords']['z'])
+def fetch_jumps(since, until, newest=None):
+    """Walk back from until to since in week long windows (the most EDSM returns per request), fetching
+    them in parallel and writing the jumps one group of windows at a time so an interrupted run can resume"""
+    global points, jumps, last
+    windows = []
+    while until > since:
+        windows.append((max(until - timedelta(days=7), since), until))
+        until = windows[-1][0]
 
-    return math.sqrt(dx*dx + dy*dy + dz*dz)
+    group_size = EDSM_CONCURRENCY * 4
+    with ThreadPoolExecutor(max_workers=EDSM_CONCURRENCY) as executor:
+        for i in range(0, len(windows), group_size):
+            group = windows[i:i + group_size]
+            for logs in executor.map(lambda window: fetch_logs(*window), group):
+                for jump in logs:
+                    if newest is None:
+                        newest = jump['date']
+                    if last != None:
+                        jumps.append((jump, last))
+                    last = jump
 
-def add_jump(src, dst):
-    global points
-    system = fetch_system(dst['system'])
-    if 'type' in system['primaryStar']:
-        points.append({
-            "measurement": "jump",
-            "time": datetime.fromisoformat(dst['date']).isoformat(),
-            "tags": {
-                "commander": EDSM_COMMANDER_NAME,
-                "system": dst['system'],
-                "firstDiscover": dst['firstDiscover'],
-                "primaryStarType": system['primaryStar']['type']
-            },
-            "fields": {
-                "distance": distance(src['system'], dst['system']),
-                "x": float(system['coords']['x']),
-                "y": float(system['coords']['y']),
-                "z": float(system['coords']['z'])
-            }
-        })
-    else:
+            fetch_systems([system for jump in jumps for system in (jump[0]['system'], jump[1]['system'])])
+            for src, dst in jumps:
+                add_jump(src, dst)
+            write_points(points)
+            points = []
+            jumps = []
+            state.set('edsm', 'backfill', {'since': since.isoformat(), 'until': group[-1][0].isoformat(), 'last': last, 'newest': newest})
+            logging.info("Fetched jumps back to %s", group[-1][0])
+
+    return newest
+
+def main():
+    global points, jumps, last, system_cache
+    if not EDSM_API_KEY:
+        logging.error("EDSM_API_KEY not set in config.py")
+        sys.exit(1)
+
+    points = []
+    jumps = []
+    last = None
+    if system_cache is None:
+        system_cache = SystemCache(EDSM_SYSTEMS_FILE)
+    connect(EDSM_DATABASE)
+
+    try:
+        response = httpclient.get('https://www.edsm.net/api-commander-v1/get-credits',
+            params={'commanderName':EDSM_COMMANDER_NAME, 'apiKey':EDSM_API_KEY})
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        logging.error("HTTP request failed: %s", err)
+        sys.exit(1)
+
+    data = response.json()
+    if 'credits' not in data:
+        logging.error("Unable to fetch data from EDSM: %s", data['msg'])
+        sys.exit(1)
+
+    logging.info("Got credits from EDSM")
+
+    for credits in data['credits']:
         points.append({
-            "measurement": "jump",
-            "time": datetime.fromisoformat(dst['date']).isoformat(),
+            "measurement": "credits",
+            "time": datetime.fromisoformat(credits['date']).isoformat(),
             "tags": {
-                "commander": EDSM_COMMANDER_NAME,
-                "system": dst['system'],
-                "firstDiscover": dst['firstDiscover']
+                "commander": EDSM_COMMANDER_NAME
             },
             "fields": {
-                "distance": distance(src['system'], dst['system']),
-                "x": float(system['coords']['x']),
-                "y": float(system['coords']['y']),
-                "z": float(system['coords']['z'])
+                "value": credits['balance']
             }
         })
 
-def fetch_jumps(time):
-    global last
     try:
-        response = requests.get('https://www.edsm.net/api-logs-v1/get-logs',
-            params={'commanderName':EDSM_COMMANDER_NAME, 'apiKey':EDSM_API_KEY, 'endDateTime':time})
+        response = httpclient.get('https://www.edsm.net/api-commander-v1/get-ranks',
+            params={'commanderName':EDSM_COMMANDER_NAME, 'apiKey':EDSM_API_KEY})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
-        print("HTTP request failed: %s", err)
-        sys.exit(1)
+        logging.error("HTTP request failed: %s" % (err))
+        sys.exit()
 
     data = response.json()
-    logging.info("Got %s jumps from EDSM", len(data['logs']))
-
-    for jump in data['logs']:
-        if last != None:
-            add_jump(jump, last)
-        last = jump
-
-    return data
-
-connect(EDSM_DATABASE)
-
-try:
-    response = requests.get('https://www.edsm.net/api-commander-v1/get-credits',
-        params={'commanderName':EDSM_COMMANDER_NAME, 'apiKey':EDSM_API_KEY})
-    response.raise_for_status()
-except requests.exceptions.HTTPError as err:
-    logging.error("HTTP request failed: %s", err)
-    sys.exit(1)
+    logging.info("Got ranks from EDSM")
+    add_rank(data, "Combat")
+    add_rank(data, "Trade")
+    add_rank(data, "Explore")
+    add_rank(data, "CQC")
+    add_rank(data, "Federation")
+    add_rank(data, "Empire")
+    add_rank(data, "Soldier")
+    add_rank(data, "Exobiologist")
 
-data = response.json()
-if 'credits' not in data:
-    logging.error("Unable to fetch data from EDSM: %s", data['msg'])
-    sys.exit(1)
+    # Resume an interrupted backfill, otherwise fetch everything since the last jump stored
+    checkpoint = state.get('edsm', 'jump_date')
+    progress = state.get('edsm', 'backfill')
+    if progress is not None:
+        since = datetime.fromisoformat(progress['since'])
+        until = datetime.fromisoformat(progress['until'])
+        last = progress['last']
+        logging.info("Resuming jump backfill from %s", until)
+    else:
+        until = datetime.utcnow()
+        if '--backfill' in sys.argv[1:] or state.full:
+            # The whole history, jump_date is only moved once the backfill has finished
+            since = datetime.fromisoformat(EDSM_BACKFILL_START)
+        elif checkpoint is not None:
+            since = datetime.fromisoformat(checkpoint)
+        else:
+            since = until - timedelta(days=7)
 
-logging.info("Got credits from EDSM")
+    newest = fetch_jumps(since, until, progress['newest'] if progress is not None else None)
+    if len(points) > 0:
+        write_points(points)
+    state.set('edsm', 'jump_date', max(filter(None, (newest, checkpoint)), default=since.strftime('%Y-%m-%d %H:%M:%S')))
+    state.set('edsm', 'backfill', None)
 
-for credits in data['credits']:
-    points.append({
-        "measurement": "credits",
-        "time": datetime.fromisoformat(credits['date']).isoformat(),
-        "tags": {
-            "commander": EDSM_COMMANDER_NAME
-        },
-        "fields": {
-            "value": credits['balance']
-        }
-    })
 
-try:
-    response = requests.get('https://www.edsm.net/api-commander-v1/get-ranks',
-        params={'commanderName':EDSM_COMMANDER_NAME, 'apiKey':EDSM_API_KEY})
-    response.raise_for_status()
-except requests.exceptions.HTTPError as err:
-    logging.error("HTTP request failed: %s" % (err))
-    sys.exit()
-
-data = response.json()
-logging.info("Got ranks from EDSM")
-add_rank(data, "Combat")
-add_rank(data, "Trade")
-add_rank(data, "Explore")
-add_rank(data, "CQC")
-add_rank(data, "Federation")
-add_rank(data, "Empire")
-add_rank(data, "Soldier")
-add_rank(data, "Exobiologist")
-
-requests_cache.install_cache('edsm')
-data = fetch_jumps(date.today().isoformat() + " 00:00:00")
-if len(data['logs']) > 0:
-    data = fetch_jumps(data['startDateTime'])
-    while len(data['logs']) == 0:
-        data = fetch_jumps(data['startDateTime'])
-
-write_points(points)
+if __name__ == "__main__":
+    main()
@@ -13,23 +13,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys, logging
+import requests, httpclient, sys, logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, datetime, time, timedelta
-from publicsuffix2 import PublicSuffixList
+from activities import ActivityClassifier
 from config import *
 
-if not EXIST_ACCESS_TOKEN:
-    logging.error("EXIST_ACCESS_TOKEN not set in config.py")
-    sys.exit(1)
+classifier = None
 
-points = []
-start_time = str(int(LOCAL_TIMEZONE.localize(datetime.combine(date.today(), time(0,0)) - timedelta(days=7)).astimezone(pytz.utc).timestamp()) * 1000) + 'ms'
-
-def append_tags(tags):
+def acquire_attributes(attributes):
     try:
-        response = requests.post('https://exist.io/api/1/attributes/custom/append/',
+        response = httpclient.post('https://exist.io/api/1/attributes/acquire/',
             headers={'Authorization':f'Bearer {EXIST_ACCESS_TOKEN}'},
-            json=tags)
+            json=attributes)
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         logging.error("HTTP request failed: %s", err)
@@ -40,177 +36,195 @@ def append_tags(tags):
         logging.error("Request failed: %s", result['failed'])
         sys.exit(1)
 
-    if len(result['success']) > 0:
-        logging.info("Successfully sent %s tags", len(result['success']))
-
-def acquire_attributes(attributes):
+def post_batch(url, items):
+    """Post one batch to exist.io, returns the items that failed"""
     try:
-        response = requests.post('https://exist.io/api/1/attributes/acquire/',
+        response = httpclient.post(url,
             headers={'Authorization':f'Bearer {EXIST_ACCESS_TOKEN}'},
-            json=attributes)
+            json=items)
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         logging.error("HTTP request failed: %s", err)
+        return [dict(item, error=str(err)) for item in items]
+
+    return response.json()['failed']
+
+def post_items(url, items, key):
+    """Post items to exist.io in concurrent batches that fit its per-request limit, retrying only
+    the items that failed. Returns the items that were accepted."""
+    accepted = []
+    pending = items
+    for attempt in range(EXIST_RETRIES + 1):
+        if len(pending) == 0:
+            break
+        batches = [pending[i:i + EXIST_BATCH_SIZE] for i in range(0, len(pending), EXIST_BATCH_SIZE)]
+        with ThreadPoolExecutor(max_workers=EXIST_CONCURRENCY) as executor:
+            results = list(executor.map(lambda batch: post_batch(url, batch), batches))
+
+        pending = []
+        failed = []
+        for batch, batch_failed in zip(batches, results):
+            failed_keys = {key(item) for item in batch_failed}
+            failed.extend(batch_failed)
+            for item in batch:
+                if key(item) in failed_keys:
+                    pending.append(item)
+                else:
+                    accepted.append(item)
+
+    if len(pending) > 0:
+        logging.error("exist.io did not accept %s items: %s", len(pending), failed[:10])
+    return accepted
+
+def daily_sums(client, database, field, measurement, where, tag=None):
+    """Sum a field per day in LOCAL_TIMEZONE (and per tag value) inside InfluxDB, yields (tag value, day, total)"""
+    client.switch_database(database)
+    group_by = 'time(1d)' if tag is None else f'time(1d), "{tag}"'
+    result = client.query(f'SELECT sum("{field}") AS "total" FROM "{measurement}" WHERE {where} GROUP BY {group_by} fill(none) tz(\'{LOCAL_TIMEZONE.zone}\')')
+    for (_, tags), rows in result.items():
+        for row in rows:
+            yield (tags or {}).get(tag), row['time'][:10], row['total']
+
+def main():
+    global classifier
+    if not EXIST_ACCESS_TOKEN:
+        logging.error("EXIST_ACCESS_TOKEN not set in config.py")
         sys.exit(1)
 
-    result = response.json()
-    if len(result['failed']) > 0:
-        logging.error("Request failed: %s", result['failed'])
-        sys.exit(1)
+    points = []
+    # Totals are per day and playtime and watches can be recorded late, so always look back at least a week,
+    # further if the last successful sync was longer ago. Days that didn't change aren't sent again.
+    today = date.today()
+    since = min(date.fromisoformat(state.get('exist', 'synced', today.isoformat())), today - timedelta(days=7))
+    days = (today - since).days + 1
+    start_time = str(int(LOCAL_TIMEZONE.localize(datetime.combine(since, time(0,0))).astimezone(pytz.utc).timestamp()) * 1000) + 'ms'
+    client = connect(EXIST_DATABASE)
+
+    acquire_attributes([{"name":"gaming_min", "active":True}, {"name":"tv_min", "active":True}])
 
-def post_attributes(values):
     try:
-        response = requests.post('https://exist.io/api/1/attributes/update/',
-            headers={'Authorization':f'Bearer {EXIST_ACCESS_TOKEN}'},
-            json=values)
+        response = httpclient.get('https://exist.io/api/1/users/' + EXIST_USERNAME + '/insights/',
+            headers={'Authorization':f'Bearer {EXIST_ACCESS_TOKEN}'})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         logging.error("HTTP request failed: %s", err)
         sys.exit(1)
 
-    result = response.json()
-    if len(result['failed']) > 0:
-        logging.error("Request failed: %s", result['failed'])
-        sys.exit(1)
+    data = response.json()
+    logging.info("Got %s insights from exist.io", len(data['results']))
 
-    if len(result['success']) > 0:
-        logging.info("Successfully sent %s attributes" % len(result['success']))
-
-client = connect(EXIST_DATABASE)
-
-acquire_attributes([{"name":"gaming_min", "active":True}, {"name":"tv_min", "active":True}])
-
-try:
-    response = requests.get('https://exist.io/api/1/users/' + EXIST_USERNAME + '/insights/',
-        headers={'Authorization':f'Bearer {EXIST_ACCESS_TOKEN}'})
-    response.raise_for_status()
-except requests.exceptions.HTTPError as err:
-    logging.error("HTTP request failed: %s", err)
-    sys.exit(1)
-
-data = response.json()
-logging.info("Got %s insights from exist.io", len(data['results']))
-
-for insight in data['results']:
-    if insight['target_date'] == None:
-        date = datetime.fromisoformat(insight['created'].strip('Z')).strftime('%Y-%m-%d')
-    else:
-        date = insight['target_date']
-    points.append({
-        "measurement": "insight",
-        "time": date + "T00:00:00",
-        "tags": {
-            "type": insight['type']['name'],
-            "attribute": insight['type']['attribute']['label'],
-            "group": insight['type']['attribute']['group']['label'],
-        },
-        "fields": {
-            "html": insight['html'].replace("\n", "").replace("\r", ""),
-            "text": insight['text']
-        }
-    })
-
-try:
-    response = requests.get('https://exist.io/api/1/users/' + EXIST_USERNAME + '/attributes/?limit=7&groups=custom,mood',
-        headers={'Authorization':f'Bearer {EXIST_ACCESS_TOKEN}'})
-    response.raise_for_status()
-except requests.exceptions.HTTPError as err:
-    logging.error("HTTP request failed: %s", err)
-    sys.exit(1)
-
-data = response.json()
-logging.info("Got attributes from exist.io")
-
-for result in data:
-    for value in result['values']:
-        if value['value'] and result['attribute'] != 'custom':
-            if result['group']['name'] == 'custom':
-                points.append({
-                    "measurement": result['group']['name'],
-                    "time": value['date'] + "T00:00:00",
-                    "tags": {
-                        "tag": result['label']
-                    },
-                    "fields": {
-                        "value": value['value']
-                    }
-                })
-            else:
-                points.append({
-                    "measurement": result['attribute'],
-                    "time": value['date'] + "T00:00:00",
-                    "fields": {
-                        "value": value['value']
-                    }
-                })
-
-write_points(points)
-
-values = []
-tags = []
-if FITBIT_DATABASE and EXIST_USE_FITBIT:
-    client.switch_database(FITBIT_DATABASE)
-    durations = client.query(f'SELECT "duration" FROM "activity" WHERE (activityName = \'Meditating\' OR activityName = \'Meditation\')AND time >= {start_time}')
-    for duration in list(durations.get_points()):
-        if duration['duration'] > 0:
-            date = datetime.fromisoformat(duration['time'].strip('Z') + "+00:00").astimezone(LOCAL_TIMEZONE).strftime('%Y-%m-%d')
-            tags.append({'date': date, 'value': 'meditation'})
-
-    durations = client.query(f'SELECT "duration","activityName" FROM "activity" WHERE activityName != \'Meditating\' AND activityName != \'Meditation\' AND time >= {start_time}')
-    for duration in list(durations.get_points()):
-        if duration['duration'] > 0:
-            date = datetime.fromisoformat(duration['time'].strip('Z') + "+00:00").astimezone(LOCAL_TIMEZONE).strftime('%Y-%m-%d')
-            tags.append({'date': date, 'value': 'exercise'})
-            tags.append({'date': date, 'value': duration['activityName'].lower().replace(" ", "_")})
-
-if TRAKT_DATABASE and EXIST_USE_TRAKT:
-    totals = {}
-    client.switch_database(TRAKT_DATABASE)
-    durations = client.query(f'SELECT "duration" FROM "watch" WHERE time >= {start_time}')
-    for duration in list(durations.get_points()):
-        date = datetime.fromisoformat(duration['time'].strip('Z') + "+00:00").astimezone(LOCAL_TIMEZONE).strftime('%Y-%m-%d')
-        if date in totals:
-            totals[date] = totals[date] + duration['duration']
-        else:
-            totals[date] = duration['duration']
-
-    for date in totals:
-        values.append({'date': date, 'name': 'tv_min', 'value': int(totals[date])})
-        tags.append({'date': date, 'value': 'tv'})
-
-if GAMING_DATABASE and EXIST_USE_GAMING:
-    totals = {}
-    client.switch_database(GAMING_DATABASE)
-    durations = client.query(f'SELECT "value" FROM "time" WHERE "value" > 0 AND time >= {start_time}')
-    for duration in list(durations.get_points()):
-        date = datetime.fromisoformat(duration['time'].strip('Z') + "+00:00").astimezone(LOCAL_TIMEZONE).strftime('%Y-%m-%d')
-        if date in totals:
-            totals[date] = totals[date] + duration['value']
+    for insight in data['results']:
+        if insight['target_date'] == None:
+            day = datetime.fromisoformat(insight['created'].strip('Z')).strftime('%Y-%m-%d')
         else:
-            totals[date] = duration['value']
-
-    for date in totals:
-        values.append({'date': date, 'name': 'gaming_min', 'value': int(totals[date] / 60)})
-        tags.append({'date': date, 'value': 'gaming'})
-elif RESCUETIME_DATABASE and EXIST_USE_RESCUETIME:
-    psl = PublicSuffixList()
-    totals = {}
-    client.switch_database(RESCUETIME_DATABASE)
-    durations = client.query(f'SELECT "duration","activity" FROM "activity" WHERE category = \'Games\' AND activity != \'Steam\' AND activity != \'steamwebhelper\' AND activity != \'origin\' AND activity != \'mixedrealityportal\' AND activity != \'holoshellapp\' AND activity != \'vrmonitor\' AND activity != \'vrserver\' AND activity != \'oculusclient\' AND activity != \'vive\' AND activity != \'obs64\' AND time >= {start_time}')
-    for duration in list(durations.get_points()):
-        date = datetime.fromisoformat(duration['time'].strip('Z') + "+00:00").astimezone(LOCAL_TIMEZONE).strftime('%Y-%m-%d')
-        if psl.get_public_suffix(duration['activity'], strict=True) is None:
-            if date in totals:
-                totals[date] = totals[date] + duration['duration']
-            else:
-                totals[date] = duration['duration']
-
-    for date in totals:
-        values.append({'date': date, 'name': 'gaming_min', 'duration': int(totals[date] / 60)})
-        tags.append({'date': date, 'value': 'gaming'})
-
-if len(tags) > 0:
-    append_tags(tags)
-
-if len(values) > 0:
-    post_attributes(values)
+            day = insight['target_date']
+        points.append({
+            "measurement": "insight",
+            "time": day + "T00:00:00",
+            "tags": {
+                "type": insight['type']['name'],
+                "attribute": insight['type']['attribute']['label'],
+                "group": insight['type']['attribute']['group']['label'],
+            },
+            "fields": {
+                "html": insight['html'].replace("\n", "").replace("\r", ""),
+                "text": insight['text']
+            }
+        })
+
+    try:
+        response = httpclient.get('https://exist.io/api/1/users/' + EXIST_USERNAME + '/attributes/',
+            params={'limit': min(days, 31), 'groups': 'custom,mood'},
+            headers={'Authorization':f'Bearer {EXIST_ACCESS_TOKEN}'})
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        logging.error("HTTP request failed: %s", err)
+        sys.exit(1)
+
+    data = response.json()
+    logging.info("Got attributes from exist.io")
+
+    for result in data:
+        for value in result['values']:
+            if value['value'] and result['attribute'] != 'custom':
+                if result['group']['name'] == 'custom':
+                    points.append({
+                        "measurement": result['group']['name'],
+                        "time": value['date'] + "T00:00:00",
+                        "tags": {
+                            "tag": result['label']
+                        },
+                        "fields": {
+                            "value": value['value']
+                        }
+                    })
+                else:
+                    points.append({
+                        "measurement": result['attribute'],
+                        "time": value['date'] + "T00:00:00",
+                        "fields": {
+                            "value": value['value']
+                        }
+                    })
+
+    write_points(points)
+
+    values = []
+    tags = []
+    if FITBIT_DATABASE and EXIST_USE_FITBIT:
+        for activity, day, total in daily_sums(client, FITBIT_DATABASE, 'duration', 'activity', f'time >= {start_time}', 'activityName'):
+            if total > 0:
+                if activity == 'Meditating' or activity == 'Meditation':
+                    tags.append({'date': day, 'value': 'meditation'})
+                else:
+                    tags.append({'date': day, 'value': 'exercise'})
+                    tags.append({'date': day, 'value': activity.lower().replace(" ", "_")})
+
+    if TRAKT_DATABASE and EXIST_USE_TRAKT:
+        for _, day, total in daily_sums(client, TRAKT_DATABASE, 'duration', 'watch', f'time >= {start_time}'):
+            values.append({'date': day, 'name': 'tv_min', 'value': int(total)})
+            tags.append({'date': day, 'value': 'tv'})
+
+    if GAMING_DATABASE and EXIST_USE_GAMING:
+        for _, day, total in daily_sums(client, GAMING_DATABASE, 'value', 'time', f'"value" > 0 AND time >= {start_time}'):
+            values.append({'date': day, 'name': 'gaming_min', 'value': int(total / 60)})
+            tags.append({'date': day, 'value': 'gaming'})
+    elif RESCUETIME_DATABASE and EXIST_USE_RESCUETIME:
+        if classifier is None:
+            classifier = ActivityClassifier(RESCUETIME_ACTIVITY_CACHE, RESCUETIME_EXCLUDED_ACTIVITIES)
+        totals = {}
+        for activity, day, total in daily_sums(client, RESCUETIME_DATABASE, 'duration', 'activity', f'category = \'Games\' AND time >= {start_time}', 'activity'):
+            if classifier.is_game(activity):
+                totals[day] = totals.get(day, 0) + total
+        classifier.save()
+
+        for day in totals:
+            values.append({'date': day, 'name': 'gaming_min', 'value': int(totals[day] / 60)})
+            tags.append({'date': day, 'value': 'gaming'})
+
+    # Only send what changed since the last run
+    sent = state.get('exist', 'sent', {})
+    values = [value for value in values if sent.get(value['date'], {}).get('values', {}).get(value['name']) != value['value']]
+    tags = [{'date': day, 'value': tag} for day, tag in sorted({(tag['date'], tag['value']) for tag in tags}) if tag not in sent.get(day, {}).get('tags', [])]
+
+    accepted_tags = post_items('https://exist.io/api/1/attributes/custom/append/', tags, lambda tag: (tag['date'], tag['value']))
+    for tag in accepted_tags:
+        sent.setdefault(tag['date'], {}).setdefault('tags', []).append(tag['value'])
+    if len(tags) > 0:
+        logging.info("Successfully sent %s / %s tags", len(accepted_tags), len(tags))
+
+    accepted_values = post_items('https://exist.io/api/1/attributes/update/', values, lambda value: (value['date'], value['name']))
+    for value in accepted_values:
+        sent.setdefault(value['date'], {}).setdefault('values', {})[value['name']] = value['value']
+    if len(values) > 0:
+        logging.info("Successfully sent %s / %s attributes", len(accepted_values), len(values))
+
+    oldest = (today - timedelta(days=31)).isoformat()
+    state.set('exist', 'sent', {day: sent[day] for day in sent if day >= oldest})
+    # Keep the window open until everything in it was accepted, so rejected items are sent again next time
+    if len(accepted_tags) == len(tags) and len(accepted_values) == len(values):
+        state.set('exist', 'synced', today.isoformat())
+
+
+if __name__ == "__main__":
+    main()
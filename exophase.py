@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Shared Exophase client for the collectors of platforms linked to Exophase.
+# Player IDs are kept in the state file, game pages go through the HTTP cache
+# (see HTTP_CACHE_RULES) and every request to Exophase, from any collector in
+# the process, shares one concurrency limit.
+
+import requests
+import httpclient
+import htmlextract
+import sys
+from datetime import datetime
+from threading import BoundedSemaphore
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+from config import *
+
+slots = BoundedSemaphore(max(EXOPHASE_CONCURRENCY, 1))
+
+
+def get(url, max_age=None):
+    try:
+        with slots:
+            response = httpclient.get(url, max_age=max_age)
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        logging.error("HTTP request failed: %s", err)
+        sys.exit(1)
+    return response
+
+
+def player_ids(name=EXOPHASE_NAME):
+    """Returns the [playerid, userid] of an Exophase user, scraping the profile only the first time"""
+    ids = state.get('exophase', f'player:{name}')
+    if ids is None:
+        soup = htmlextract.parse(get(f"https://www.exophase.com/user/{name}").text)
+        ids = [soup.find("a", attrs={'data-playerid': True})['data-playerid'],
+               soup.find("div", attrs={'data-userid': True})['data-userid']]
+        state.set('exophase', f'player:{name}', ids)
+    return ids
+
+
+def latest_games(platform, name):
+    games = []
+    soup = htmlextract.parse(get(f"https://www.exophase.com/{platform}/user/{name}").text, "li", {'data-gameid': True})
+    for game in soup.find_all("li", attrs={'data-gameid': True}):
+        try:
+            playtime = int(float(game.select_one(
+                "span.hours").get_text()[:-1]) * 60)
+            img = game.select_one("div.image > img")['src']
+            img = urljoin(img, urlparse(img).path).replace(
+                "/games/m/", "/games/l/")
+            games.append({'gameid': game['data-gameid'],
+                          'time': datetime.fromtimestamp(float(game['data-lastplayed'])),
+                          'title': game.select_one("h3 > a").string,
+                          'url': game.select_one("h3 > a")['href'],
+                          'image': img,
+                          'playtime': playtime,
+                          })
+        except Exception:  # Games with out total played time
+            pass
+
+    return games
+
+
+def earned(game):
+    """Returns the awards earned in a game, as listed by the Exophase API"""
+    api_data = get(f"https://api.exophase.com/public/player/{urlparse(game['url']).fragment}/game/{game['gameid']}/earned").json()
+    if api_data['success'] != True:
+        return []
+    return api_data['list']
+
+
+def awards(game, max_age=None):
+    """Returns the name, description and icon of every award of a game by id"""
+    award_data = {}
+    soup = htmlextract.parse(get(game['url'], max_age).text, "li", {'data-type': 'achievement'})
+    for award in soup.find_all("li", attrs={'data-type': 'achievement'}):
+        img = award.select_one("div.image > img")['src']
+        img = urljoin(img, urlparse(img).path)
+        award_data[award['id']] = {'id': award['id'],
+                                   'name': award.select_one("div.award-title > a").string.replace("\xa0", " "),
+                                   'description': award.select_one("div.award-description > p").string.replace("\xa0", " "),
+                                   'image': img
+                                   }
+    return award_data
+
+
+def achievements(game):
+    """Returns the earned awards of a game with the time they were earned"""
+    earned_list = earned(game)
+    if len(earned_list) == 0:
+        return []
+
+    award_data = awards(game)
+    # Awards added since the game page was cached aren't on it yet
+    if any(str(achievement['awardid']) not in award_data for achievement in earned_list):
+        award_data = awards(game, max_age=0)
+    achievements = []
+    for achievement in earned_list:
+        if str(achievement['awardid']) not in award_data:
+            logging.warning("Award %s of %s not found on %s", achievement['awardid'], game['title'], game['url'])
+            continue
+        data = dict(award_data[str(achievement['awardid'])])
+        data['time'] = datetime.fromtimestamp(achievement['timestamp'])
+        achievements.append(data)
+    return achievements
+
+
+def fetch_games(games, fetch=achievements):
+    """Calls fetch for every game concurrently, returns (game, result) pairs in order"""
+    with ThreadPoolExecutor(max_workers=max(EXOPHASE_CONCURRENCY, 1)) as executor:
+        return list(zip(games, executor.map(fetch, games)))
@@ -13,16 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys, os, pytz
+import requests, httpclient, sys, os, pytz
 from datetime import datetime, date, timedelta
 from config import *
 
 POINTS = []
+TOKEN_EXPIRES = None
 
 
 def fetch_data(category, type):
     try:
-        response = requests.get(f'https://api.fitbit.com/1/user/-/{category}/{type}/date/today/1d.json', 
+        response = httpclient.get(f'https://api.fitbit.com/1/user/-/{category}/{type}/date/today/1d.json', 
             headers={'Authorization': f'Bearer {FITBIT_ACCESS_TOKEN}', 'Accept-Language': FITBIT_LANGUAGE})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
@@ -44,7 +45,7 @@ def fetch_data(category, type):
 
 def fetch_heartrate(date):
     try:
-        response = requests.get(f'https://api.fitbit.com/1/user/-/activities/heart/date/{date}/1d/1min.json', 
+        response = httpclient.get(f'https://api.fitbit.com/1/user/-/activities/heart/date/{date}/1d/1min.json', 
             headers={'Authorization': f'Bearer {FITBIT_ACCESS_TOKEN}', 'Accept-Language': FITBIT_LANGUAGE})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
@@ -130,7 +131,7 @@ def process_levels(levels):
 
 def fetch_activities(date):
     try:
-        response = requests.get('https://api.fitbit.com/1/user/-/activities/list.json',
+        response = httpclient.get('https://api.fitbit.com/1/user/-/activities/list.json',
             headers={'Authorization': f'Bearer {FITBIT_ACCESS_TOKEN}', 'Accept-Language': FITBIT_LANGUAGE},
             params={'beforeDate': date, 'sort':'desc', 'limit':10, 'offset':0})
         response.raise_for_status()
@@ -205,12 +206,16 @@ def _get_refresh_token():
 
 def login():
     connect(FITBIT_DATABASE)
-    global FITBIT_ACCESS_TOKEN
+    global FITBIT_ACCESS_TOKEN, TOKEN_EXPIRES
+
+    # Tokens we refreshed ourselves expire, refresh again when running as a long lived process
+    if TOKEN_EXPIRES is not None and TOKEN_EXPIRES < datetime.now():
+        FITBIT_ACCESS_TOKEN = ''
 
     if not FITBIT_ACCESS_TOKEN:
         refresh_token = _get_refresh_token()
         if refresh_token is not None:
-            response = requests.post('https://api.fitbit.com/oauth2/token',
+            response = httpclient.post('https://api.fitbit.com/oauth2/token',
                 data={
                     "client_id": FITBIT_CLIENT_ID,
                     "grant_type": "refresh_token",
@@ -218,7 +223,7 @@ def login():
                     "refresh_token": refresh_token
                 }, auth=(FITBIT_CLIENT_ID, FITBIT_CLIENT_SECRET))
         else:
-            response = requests.post('https://api.fitbit.com/oauth2/token',
+            response = httpclient.post('https://api.fitbit.com/oauth2/token',
                 data={
                     "client_id": FITBIT_CLIENT_ID,
                     "grant_type": "authorization_code",
@@ -230,13 +235,14 @@ def login():
 
         json = response.json()
         FITBIT_ACCESS_TOKEN = json['access_token']
+        TOKEN_EXPIRES = datetime.now() + timedelta(seconds=int(json.get('expires_in', 28800)) - 60)
         refresh_token = json['refresh_token']
         _write_refresh_token(refresh_token)
 
 
 def get_devices():
     try:
-        response = requests.get('https://api.fitbit.com/1/user/-/devices.json',
+        response = httpclient.get('https://api.fitbit.com/1/user/-/devices.json',
             headers={'Authorization': f'Bearer {FITBIT_ACCESS_TOKEN}', 'Accept-Language': FITBIT_LANGUAGE})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
@@ -267,7 +273,7 @@ def get_sleeps():
     start = end - timedelta(days=1)
 
     try:
-        response = requests.get(f'https://api.fitbit.com/1.2/user/-/sleep/date/{start.isoformat()}/{end.isoformat()}.json',
+        response = httpclient.get(f'https://api.fitbit.com/1.2/user/-/sleep/date/{start.isoformat()}/{end.isoformat()}.json',
             headers={'Authorization': f'Bearer {FITBIT_ACCESS_TOKEN}', 'Accept-Language': FITBIT_LANGUAGE})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
@@ -321,6 +327,11 @@ def get_sleeps():
 
 
 def main():
+    if not FITBIT_CLIENT_ID or not FITBIT_CLIENT_SECRET:
+        logging.error("FITBIT_CLIENT_ID or FITBIT_CLIENT_SECRET not set in config.py")
+        sys.exit(1)
+
+    POINTS.clear()
     login()
     get_devices()
     get_sleeps()
@@ -346,7 +357,4 @@ def main():
 
 
 if __name__ == "__main__":
-    if not FITBIT_CLIENT_ID or not FITBIT_CLIENT_SECRET:
-        logging.error("FITBIT_CLIENT_ID or FITBIT_CLIENT_SECRET not set in config.py")
-        sys.exit(1)
     main()
@@ -13,14 +13,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys
+import requests, httpclient, sys
 from datetime import datetime, date, timedelta
 from config import *
 
-if not FOURSQUARE_ACCESS_TOKEN:
-    logging.error("FOURSQUARE_ACCESS_TOKEN not set in config.py")
-    sys.exit(1)
-
 points = []
 
 us_states = {
@@ -81,10 +77,12 @@ us_states = {
     'Wyoming': 'WY',
 }
 
-def fetch_checkins(offset):
+def fetch_checkins(offset, after=None):
+    params = {'sort': 'newestfirst', 'offset': offset, 'oauth_token':FOURSQUARE_ACCESS_TOKEN, 'v':'20191201', 'limit':250}
+    if after is not None:
+        params['afterTimestamp'] = after
     try:
-        response = requests.get('https://api.foursquare.com/v2/users/self/checkins',
-            params={'sort': 'newestfirst', 'offset': offset, 'oauth_token':FOURSQUARE_ACCESS_TOKEN, 'v':'20191201', 'limit':250})
+        response = httpclient.get('https://api.foursquare.com/v2/users/self/checkins', params=params)
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         logging.error("HTTP request failed: %s", err)
@@ -124,8 +122,30 @@ def fetch_checkins(offset):
                     }
                 })
 
-    return len(data['response']['checkins']['items'])
+    return data['response']['checkins']['items']
+
+def main():
+    global points
+    if not FOURSQUARE_ACCESS_TOKEN:
+        logging.error("FOURSQUARE_ACCESS_TOKEN not set in config.py")
+        sys.exit(1)
+
+    points = []
+    connect(FOURSQUARE_DATABASE)
+
+    after = state.get('foursquare', 'created_at')
+    items = fetch_checkins(0, after)
+    newest = max([item['createdAt'] for item in items], default=after)
+    offset = len(items)
+    # The first run only imports the latest 250 check-ins, --full pages through all of them
+    while (after is not None or state.full) and len(items) == 250:
+        items = fetch_checkins(offset, after)
+        offset += len(items)
+
+    write_points(points)
+    if newest is not None:
+        state.set('foursquare', 'created_at', newest)
+
 
-connect(FOURSQUARE_DATABASE)
-fetch_checkins(0)
-write_points(points)
+if __name__ == "__main__":
+    main()
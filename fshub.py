@@ -13,18 +13,14 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys
+import requests, httpclient, sys
 from config import *
 
-if not FSHUB_API_KEY:
-    logging.error("FSHUB_API_KEY not set in config.py")
-    sys.exit(1)
-
-points = []
+cursor = 0
 
 def fetch(limit, cursor):
     try:
-        response = requests.get(f'https://fshub.io/api/v3/pilot/{FSHUB_PILOT_ID}/flight',
+        response = httpclient.get(f'https://fshub.io/api/v3/pilot/{FSHUB_PILOT_ID}/flight',
             params={'limit': limit, 'cursor': cursor},
             headers={'X-Pilot-Token': FSHUB_API_KEY, 'Content-Type': 'application/json'})
         response.raise_for_status()
@@ -37,7 +33,7 @@ def fetch(limit, cursor):
 
     for flight in data['data']:
         if flight['departure'] != None and flight['departure']['icao'] != None and flight['arrival'] != None and flight['arrival']['icao'] != None:
-            points.append({
+            yield {
                 "measurement": "flight",
                 "time": flight['departure']['time'],
                 "tags": {
@@ -86,8 +82,8 @@ def fetch(limit, cursor):
                     "flight_url": f"https://fshub.io/flight/{str(flight['id'])}",
                     "pilot_url": f"https://fshub.io/pilot/{str(flight['user']['id'])}"
                 }
-            })
-            points.append({
+            }
+            yield {
                 "measurement": "airport",
                 "time": flight['departure']['time'],
                 "tags": {
@@ -102,8 +98,8 @@ def fetch(limit, cursor):
                     "long": flight['departure']['geo']['lng'],
                     "url": f"https://fshub.io/airport/{flight['departure']['icao'].upper()}"
                 }
-            })
-            points.append({
+            }
+            yield {
                 "measurement": "airport",
                 "time": flight['arrival']['time'],
                 "tags": {
@@ -118,17 +114,32 @@ def fetch(limit, cursor):
                     "long": flight['arrival']['geo']['lng'],
                     "url": f"https://fshub.io/airport/{flight['arrival']['icao'].upper()}"
                 }
-            })
+            }
     if data['meta']['cursor']['count'] == limit:
         return data['meta']['cursor']['next']
     else:
         return -1
 
-connect(FSHUB_DATABASE)
+def flights(limit):
+    global cursor
+    while True:
+        next_cursor = yield from fetch(limit, cursor)
+        # Keep the cursor of the last, partial page so the next run picks up flights added to it
+        if next_cursor == -1:
+            return
+        cursor = next_cursor
+
+def main():
+    global cursor
+    if not FSHUB_API_KEY:
+        logging.error("FSHUB_API_KEY not set in config.py")
+        sys.exit(1)
+
+    connect(FSHUB_DATABASE)
+    cursor = state.get('fshub', 'cursor', 0)
+    write_points(flights(100))
+    state.set('fshub', 'cursor', cursor)
 
-cursor = 0
 
-while cursor != -1:
-    cursor = fetch(100,cursor)
-    write_points(points)
-    points = []
+if __name__ == "__main__":
+    main()
@@ -13,15 +13,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys
+import requests, httpclient, sys
 from datetime import datetime
 from config import *
 
-if not GITHUB_API_KEY:
-    logging.error("GITHUB_API_KEY not set in config.py")
-    sys.exit(1)
+points = []
 
-def add_week(week):
+def add_week(repo, week):
     if week['c'] > 0:
         points.append({
             "measurement": "commits",
@@ -35,45 +33,51 @@ def add_week(week):
             }
         })
 
-connect(GITHUB_DATABASE)
-
-try:
-    response = requests.get('https://api.github.com/user/repos',
-        params={'sort': 'pushed', 'per_page':10},
-        headers={'Authorization': f'token {GITHUB_API_KEY}', 'User-Agent': GITHUB_USERNAME})
-    response.raise_for_status()
-except requests.exceptions.HTTPError as err:
-    logging.error("HTTP request failed: %s", err)
-    sys.exit(1)
+def main():
+    global points
+    if not GITHUB_API_KEY:
+        logging.error("GITHUB_API_KEY not set in config.py")
+        sys.exit(1)
 
-repos = response.json()
-if len(repos) == 0:
-    logging.error("No GitHub repos found")
-    sys.exit(1)
-logging.info("Got %s repos from GitHub", len(repos))
+    connect(GITHUB_DATABASE)
 
-points = []
-
-for repo in repos:
-    logging.info("Fetch statistics for %s", repo['full_name'])
     try:
-        response = requests.get(repo['url'] + '/stats/contributors',
-            params={'sort': 'pushed'},
+        response = httpclient.get('https://api.github.com/user/repos',
+            params={'sort': 'pushed', 'per_page':10},
             headers={'Authorization': f'token {GITHUB_API_KEY}', 'User-Agent': GITHUB_USERNAME})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
-        print("HTTP request failed: %s" % (err))
-        sys.exit()
+        logging.error("HTTP request failed: %s", err)
+        sys.exit(1)
+
+    repos = response.json()
+    if len(repos) == 0:
+        logging.error("No GitHub repos found")
+        sys.exit(1)
+    logging.info("Got %s repos from GitHub", len(repos))
+
+    points = []
+
+    for repo in repos:
+        logging.info("Fetch statistics for %s", repo['full_name'])
+        try:
+            response = httpclient.get(repo['url'] + '/stats/contributors',
+                params={'sort': 'pushed'},
+                headers={'Authorization': f'token {GITHUB_API_KEY}', 'User-Agent': GITHUB_USERNAME})
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            print("HTTP request failed: %s" % (err))
+            sys.exit()
+
+        contributors = response.json()
+        for contributor in contributors:
+            if contributor['author']['login'] == GITHUB_USERNAME:
+                # Weeks that haven't changed since the last run are skipped by write_points
+                for week in contributor['weeks']:
+                    add_week(repo, week)
+
+    write_points(points)
 
-    contributors = response.json()
-    for contributor in contributors:
-        if contributor['author']['login'] == GITHUB_USERNAME:
-#            adding all the old data each time causes a lot of stress on InfluxDB
-#            for week in contributor['weeks']:
-#                add_week(week)
-            if len(contributor['weeks']) > 0:
-                add_week(contributor['weeks'][len(contributor['weeks']) - 1])
-            if len(contributor['weeks']) > 1:
-                add_week(contributor['weeks'][len(contributor['weeks']) - 2])
 
-write_points(points)
+if __name__ == "__main__":
+    main()
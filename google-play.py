@@ -13,66 +13,90 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import sys, os
-from bs4 import BeautifulSoup
+import sys, os, glob, tarfile, zipfile, multiprocessing, takeout
+from hashlib import sha256
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from config import *
 
-points = []
+GAMES_DIR = 'Takeout/Google Play Games Services/Games/'
 
-def parse_activity(game):
-    file = open(f'Takeout/Google Play Games Services/Games/{game}/Activity.html')
-    html = BeautifulSoup(file, 'html.parser')
-    file.close()
+def read_file(path):
+    with open(path, 'rb') as file:
+        return file.read()
 
-    for row in html.find_all('tr'):
-        if row.contents[0].name == 'td' and row.contents[0].string == 'Time Last Played':
-            points.append({
-                    "measurement": "time",
-                    "time": row.contents[1].string,
-                    "tags": {
-                        "platform": "Google Play",
-                        "title": game,
-                    },
-                    "fields": {
-                        "value": 0
-                    }
-                })
+def directory_files():
+    for game in os.listdir(GAMES_DIR):
+        for name in takeout.PARSERS:
+            path = os.path.join(GAMES_DIR, game, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                yield path, stat.st_mtime, stat.st_size, lambda path=path: read_file(path)
 
-def parse_achievements(game):
-    file = open(f'Takeout/Google Play Games Services/Games/{game}/Experience.html')
-    html = BeautifulSoup(file, 'html.parser')
-    file.close()
+def archive_files(archives):
+    for archive in archives:
+        logging.info("Reading %s", archive)
+        try:
+            for path, mtime, size, read in takeout.members(archive, GAMES_DIR):
+                parts = path[len(GAMES_DIR):].split('/')
+                if len(parts) == 2 and parts[1] in takeout.PARSERS:
+                    yield path, mtime, size, read
+        except (OSError, tarfile.TarError, zipfile.BadZipFile) as err:
+            logging.error("Unable to read Takeout archive %s: %s", archive, err)
+            sys.exit(1)
 
-    for row in html.find_all('tr'):
-        if row.contents[0].name == 'td' and row.contents[0].string == 'Achievement unlocked':
-            date = row.contents[2].string
-            game = row.contents[6].string
-            achievement = row.contents[1].string.title()
-            apiname = row.contents[1].string
+def changed_files(files, manifest):
+    """Yields (game, file name, contents) of the pages that changed since the last import, updating manifest"""
+    for path, mtime, size, read in files:
+        entry = manifest.get(path)
+        if entry is not None and entry[:2] == [mtime, size]:
+            continue
+        data = read()
+        digest = sha256(data).hexdigest()
+        manifest[path] = [mtime, size, digest]
+        # Extracting or exporting the same data again only changes mtimes
+        if entry is not None and entry[2] == digest:
+            continue
+        game, name = path[len(GAMES_DIR):].split('/')
+        yield game, name, data
 
-            points.append({
-                    "measurement": "achievement",
-                    "time": date,
-                    "tags": {
-                        "platform": "Google Play",
-                        "title": game,
-                        "apiname": apiname
-                    },
-                    "fields": {
-                        "name": achievement
-                    }
-                })
+def parse_games(files):
+    workers = GOOGLE_PLAY_PROCESSES or os.cpu_count() or 1
+    parsed = 0
+    # This runs on the thread writing the points and forking a process that has other threads
+    # running isn't safe, so the workers are started by a forkserver with only the parsers loaded
+    context = multiprocessing.get_context('forkserver')
+    context.set_forkserver_preload(['takeout'])
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        # Only a few pages per worker are held in memory, the next file is read as each result is used
+        futures = deque()
+        for game, name, data in files:
+            futures.append(executor.submit(takeout.parse, game, name, data))
+            parsed += 1
+            if len(futures) >= workers * 2:
+                yield from futures.popleft().result()
+        while futures:
+            yield from futures.popleft().result()
+    logging.info("Parsed %s changed files", parsed)
 
-if not os.path.isdir('Takeout/Google Play Games Services/Games'):
-    logging.error("Google Takeout files not found. Please extract the archive into Takeout/")
-    sys.exit(1)
+def main():
+    archives = [arg for arg in sys.argv[1:] if not arg.startswith('-')]
+    if len(archives) == 0 and GOOGLE_PLAY_TAKEOUT:
+        archives = sorted(glob.glob(GOOGLE_PLAY_TAKEOUT))
+    if len(archives) > 0:
+        files = archive_files(archives)
+    elif os.path.isdir(GAMES_DIR):
+        files = directory_files()
+    else:
+        logging.error("Google Takeout files not found. Please pass the path to the archive or extract it into Takeout/")
+        sys.exit(1)
 
-connect(GAMING_DATABASE)
+    connect(GAMING_DATABASE)
 
-for game in os.listdir('Takeout/Google Play Games Services/Games/'):
-    if os.path.isfile(f'Takeout/Google Play Games Services/Games/{game}/Activity.html'):
-        parse_activity(game)
-    if os.path.isfile(f'Takeout/Google Play Games Services/Games/{game}/Experience.html'):
-        parse_achievements(game)
+    manifest = state.get('google-play', 'manifest', {})
+    write_points(parse_games(changed_files(files, manifest)))
+    state.set('google-play', 'manifest', manifest)
 
-write_points(points)
+
+if __name__ == "__main__":
+    main()
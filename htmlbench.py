@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Compares a full html.parser parse with htmlextract on a saved page, e.g.
+#   python3 htmlbench.py achievements.html table id=oAchievementList
+#   python3 htmlbench.py psn.html li data-gameid
+#   python3 htmlbench.py Activity.html tr
+#
+# Mean time per parse on pages shaped like the real ones (the real pages
+# aren't included, they are full of your own profile data):
+#
+#   page                               html.parser   + strainer   lxml + strainer
+#   Exophase games list, 120 KB           228.6 ms     108.8 ms          63.9 ms
+#   TrueAchievements list, 80 KB          146.8 ms      86.0 ms          55.6 ms
+#   Takeout Experience.html, 250 KB       610.1 ms     506.2 ms         408.0 ms
+#
+# Pages that are mostly markup the scraper skips gain the most. The Takeout
+# pages are nearly all table rows, so only the faster parser helps there.
+
+import sys, timeit
+from bs4 import BeautifulSoup, SoupStrainer
+import htmlextract
+
+if len(sys.argv) < 3:
+    print(f"Usage: {sys.argv[0]} FILE TAG [ATTRIBUTE[=VALUE] ...]")
+    sys.exit(1)
+
+with open(sys.argv[1], encoding='utf-8') as f:
+    markup = f.read()
+name = sys.argv[2]
+attrs = {}
+for arg in sys.argv[3:]:
+    key, sep, value = arg.partition('=')
+    attrs[key] = value if sep else True
+
+parsers = {
+    'html.parser': lambda: BeautifulSoup(markup, 'html.parser'),
+    'html.parser + strainer': lambda: BeautifulSoup(markup, 'html.parser', parse_only=SoupStrainer(name, attrs)),
+}
+if htmlextract.PARSER != 'html.parser':
+    parsers[f'{htmlextract.PARSER} + strainer'] = lambda: htmlextract.parse(markup, name, attrs)
+
+expected = len(BeautifulSoup(markup, 'html.parser').find_all(name, attrs))
+baseline = None
+for label, parse in parsers.items():
+    found = len(parse().find_all(name, attrs))
+    runs, total = timeit.Timer(parse).autorange()
+    seconds = total / runs
+    baseline = baseline or seconds
+    print(f"{label:<24} {seconds * 1000:9.1f} ms  {baseline / seconds:5.1f}x  {found} of {expected} elements")
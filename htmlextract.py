@@ -0,0 +1,31 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from importlib.util import find_spec
+from bs4 import BeautifulSoup, SoupStrainer
+
+PARSER = 'lxml' if find_spec('lxml') else 'html.parser'
+
+
+def parse(markup, name=None, attrs=None, string=None, **kwargs):
+    """Parse only the elements matching a SoupStrainer (and their children) out of markup.
+
+    Everything else is skipped while parsing instead of being built into the
+    tree, which is where most of the time goes on large pages. Uses lxml when
+    it is installed, it is several times faster than html.parser.
+    """
+    if name is None and not attrs and string is None and not kwargs:
+        return BeautifulSoup(markup, PARSER)
+    return BeautifulSoup(markup, PARSER, parse_only=SoupStrainer(name, attrs or {}, string, **kwargs))
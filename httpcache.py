@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json, time, zlib, sqlite3, threading, requests
+from hashlib import sha256
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+def _key(url):
+    # URLs can carry API keys and tokens in their query string, so only a hash of them is stored
+    return sha256(url.encode('utf-8')).hexdigest()
+
+
+class CachedResponse:
+    def __init__(self, url, headers, body, etag, last_modified, stored_at):
+        self.url = url
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    def response(self):
+        response = requests.Response()
+        response.status_code = 200
+        response.url = self.url
+        response.headers = CaseInsensitiveDict(self.headers)
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = self.body
+        response.from_cache = True
+        return response
+
+
+class ResponseCache:
+    """Persistent store of GET responses with their ETag / Last-Modified validators.
+
+    Bodies are stored zlib-compressed in a WAL mode sqlite database and the
+    least recently used entries are evicted once the cache grows past
+    max_bytes. Entries are keyed by a hash of the URL, so API keys in query
+    strings aren't written to disk. Deciding what to cache and for how long
+    is up to the caller, see httpclient.get.
+    """
+
+    def __init__(self, path, max_bytes=67108864):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            headers TEXT NOT NULL,
+            body BLOB NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            stored_at REAL NOT NULL,
+            accessed_at REAL NOT NULL,
+            size INTEGER NOT NULL)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)')
+        self._size = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, url):
+        key = _key(url)
+        with self._lock:
+            row = self._db.execute('SELECT headers, body, etag, last_modified, stored_at FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._db.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+
+        return CachedResponse(url, json.loads(row[0]), zlib.decompress(row[1]), row[2], row[3], row[4])
+
+    def refresh(self, url):
+        """Mark a stored response as fresh again after the server answered 304"""
+        now = time.time()
+        with self._lock:
+            self._db.execute('UPDATE responses SET stored_at = ?, accessed_at = ? WHERE key = ?', (now, now, _key(url)))
+
+    def set(self, url, response):
+        headers = {key: value for key, value in response.headers.items() if key.lower() not in ('content-encoding', 'content-length', 'transfer-encoding', 'set-cookie')}
+        body = zlib.compress(response.content)
+        key = _key(url)
+        size = len(body) + len(key)
+        now = time.time()
+        with self._lock:
+            old = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, json.dumps(headers), body, response.headers.get('ETag'), response.headers.get('Last-Modified'), now, now, size))
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        for key, size in self._db.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall():
+            if self._size <= target:
+                break
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._size -= size
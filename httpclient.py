@@ -0,0 +1,98 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re, random, time, threading, requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from httpcache import ResponseCache
+from config import HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_RETRIES, HTTP_BACKOFF, HTTP_POOL_HOSTS, HTTP_POOL_SIZE, \
+    HTTP_CACHE_FILE, HTTP_CACHE_RULES, HTTP_CACHE_MAX_BYTES
+
+
+class JitterRetry(Retry):
+    """Exponential backoff with full jitter, Retry-After is still honoured for 413/429/503"""
+
+    def get_backoff_time(self):
+        return random.uniform(0, super().get_backoff_time())
+
+
+class Session(requests.Session):
+    """A keep-alive session with per-host connection pools, default timeouts and retries on 429/5xx"""
+
+    def __init__(self):
+        super().__init__()
+        retry = JitterRetry(total=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF,
+            status_forcelist=(429, 500, 502, 503, 504), respect_retry_after_header=True, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+        return super().request(method, url, **kwargs)
+
+
+session = Session()
+cache_rules = [(re.compile(pattern), ttl) for pattern, ttl in HTTP_CACHE_RULES]
+cache = None
+cache_lock = threading.Lock()
+
+
+def cache_ttl(url):
+    """Returns the TTL of the first cache rule matching url, or None if responses from url are never cached"""
+    for pattern, ttl in cache_rules:
+        if pattern.search(url):
+            return ttl
+    return None
+
+
+def _cache():
+    global cache
+    with cache_lock:
+        if cache is None:
+            cache = ResponseCache(HTTP_CACHE_FILE, HTTP_CACHE_MAX_BYTES)
+    return cache
+
+
+def get(url, params=None, max_age=None, **kwargs):
+    """GET through the response cache, max_age overrides the TTL when a cached response is older than that"""
+    full_url = requests.Request('GET', url, params=params).prepare().url
+    ttl = cache_ttl(full_url)
+    if ttl is None:
+        return session.get(url, params=params, **kwargs)
+    if max_age is not None:
+        ttl = min(ttl, max_age)
+
+    entry = _cache().get(full_url)
+    if entry is not None and time.time() - entry.stored_at < ttl:
+        return entry.response()
+
+    headers = dict(kwargs.pop('headers', None) or {})
+    if entry is not None and entry.etag:
+        headers['If-None-Match'] = entry.etag
+    if entry is not None and entry.last_modified:
+        headers['If-Modified-Since'] = entry.last_modified
+
+    response = session.get(url, params=params, headers=headers, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        cache.refresh(full_url)
+        return entry.response()
+    if response.status_code == 200:
+        cache.set(full_url, response)
+    return response
+
+
+def post(url, **kwargs):
+    return session.post(url, **kwargs)
@@ -15,64 +15,80 @@
 
 import sys
 from datetime import datetime
+from itertools import islice
 from instaloader import instaloader, Profile
 from config import *
 
-if not INSTAGRAM_PROFILE:
-    logging.error("INSTAGRAM_PROFILE not set in config.py")
-    sys.exit(1)
+def main():
+    if not INSTAGRAM_PROFILE:
+        logging.error("INSTAGRAM_PROFILE not set in config.py")
+        sys.exit(1)
 
-points = []
+    points = []
+    connect(INSTAGRAM_DATABASE)
 
-connect(INSTAGRAM_DATABASE)
+    logging.info("Fetching profile for %s", INSTAGRAM_PROFILE)
+    L = instaloader.Instaloader()
+    try:
+        L.load_session_from_file(INSTAGRAM_PROFILE)
+    except FileNotFoundError:
+        logging.warning("Logging into Instagram can make this script more reliable. Try: instaloader -l {INSTAGRAM_PROFILE}")
 
-logging.info("Fetching profile for %s", INSTAGRAM_PROFILE)
-L = instaloader.Instaloader()
-try:
-    L.load_session_from_file(INSTAGRAM_PROFILE)
-except FileNotFoundError:
-    logging.warning("Logging into Instagram can make this script more reliable. Try: instaloader -l {INSTAGRAM_PROFILE}")
-
-profile = Profile.from_username(L.context, INSTAGRAM_PROFILE)
-followers = profile.followers
-points.append({
-    "measurement": "followers",
-    "time": datetime.utcnow().isoformat(),
-    "tags": {
-        "username": INSTAGRAM_PROFILE
-    },
-    "fields": {
-        "value": followers
-    }
-})
-
-posts = list(profile.get_posts())
-count = len(posts)
-logging.info("Got %s posts from Instagram", count)
-if INSTAGRAM_MAX_POSTS == 0:
-    INSTAGRAM_MAX_POSTS = count
-
-for post in posts:
+    profile = Profile.from_username(L.context, INSTAGRAM_PROFILE)
+    followers = profile.followers
     points.append({
-        "measurement": "post",
-        "time": post.date_utc.isoformat(),
+        "measurement": "followers",
+        "time": datetime.utcnow().isoformat(),
         "tags": {
-            "owner": post.owner_username,
-            "shortcode": post.shortcode,
+            "username": INSTAGRAM_PROFILE
         },
         "fields": {
-            "image": post.url,
-            "url": f'https://instagram.com/p/{post.shortcode}/',
-            "thumbnail_html": f'<img width="100%" height="100%" src="{post.url}"/>',
-            "caption": post.caption,
-            "likes": post.likes,
-            "comments": post.comments
+            "value": followers
         }
     })
 
-    logging.debug("%s / %s", len(points), INSTAGRAM_MAX_POSTS)
+    # Posts come newest first (after any pinned ones), so only page as far as needed
+    posts = profile.get_posts()
+    if INSTAGRAM_MAX_POSTS > 0:
+        posts = islice(posts, INSTAGRAM_MAX_POSTS)
+
+    # After the first run, stop at the newest post seen last time once the
+    # most recent INSTAGRAM_REFRESH_POSTS have been fetched for their likes and comments
+    last_shortcode = state.get('instagram', 'shortcode')
+    last_date = state.get('instagram', 'date')
+    newest = None
+    count = 0
+    for post in posts:
+        if last_date is not None and count >= INSTAGRAM_REFRESH_POSTS and not getattr(post, 'is_pinned', False) \
+                and (post.shortcode == last_shortcode or post.date_utc.isoformat() <= last_date):
+            break
+
+        points.append({
+            "measurement": "post",
+            "time": post.date_utc.isoformat(),
+            "tags": {
+                "owner": post.owner_username,
+                "shortcode": post.shortcode,
+            },
+            "fields": {
+                "image": post.url,
+                "url": f'https://instagram.com/p/{post.shortcode}/',
+                "thumbnail_html": f'<img width="100%" height="100%" src="{post.url}"/>',
+                "caption": post.caption,
+                "likes": post.likes,
+                "comments": post.comments
+            }
+        })
+        if newest is None or post.date_utc > newest.date_utc:
+            newest = post
+        count += 1
+
+    logging.info("Got %s posts from Instagram", count)
+    write_points(points)
+    if newest is not None:
+        state.set('instagram', 'shortcode', newest.shortcode)
+        state.set('instagram', 'date', newest.date_utc.isoformat())
+
 
-    if len(points) > INSTAGRAM_MAX_POSTS:
-        break
-    
-write_points(points)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
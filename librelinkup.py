@@ -13,7 +13,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys, os, json, time
+import requests, httpclient, sys, os, json, time
 from datetime import datetime
 from config import *
 
@@ -32,77 +32,82 @@ def append_reading(points, data, reading):
         }
     })
 
-if not LIBRELINKUP_USERNAME:
-    logging.error("LIBRELINKUP_USERNAME not set in config.py")
-    sys.exit(1)
+def main():
+    if not LIBRELINKUP_USERNAME:
+        logging.error("LIBRELINKUP_USERNAME not set in config.py")
+        sys.exit(1)
+
+    points = []
+
+    connect(LIBRELINKUP_DATABASE)
+
+    LIBRELINKUP_HEADERS = {
+        "version": LIBRELINKUP_VERSION,
+        "product": LIBRELINKUP_PRODUCT,
+    }
 
-points = []
+    LIBRELINKUP_TOKEN = None
+    script_dir = os.path.dirname(__file__)
+    auth_token_path = os.path.join(script_dir, '.librelinkup-authtoken')
+    if os.path.isfile(auth_token_path):
+        with open(auth_token_path) as json_file:
+                auth = json.load(json_file)
+                if auth['expires'] > time.time():
+                    LIBRELINKUP_TOKEN = auth['token']
+                    logging.info("Using cached authTicket, expiration: %s", datetime.fromtimestamp(auth['expires']).isoformat())
 
-connect(LIBRELINKUP_DATABASE)
+    if LIBRELINKUP_TOKEN is None:
+        logging.info("Auth ticket not found or expired, requesting a new one")
+        try:
+            response = httpclient.post(f'{LIBRELINKUP_URL}/llu/auth/login',
+                headers=LIBRELINKUP_HEADERS, json = {'email': LIBRELINKUP_USERNAME, 'password': LIBRELINKUP_PASSWORD})
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as err:
+            logging.error("HTTP request failed: %s", err)
+            sys.exit(1)
 
-LIBRELINKUP_HEADERS = {
-    "version": LIBRELINKUP_VERSION,
-    "product": LIBRELINKUP_PRODUCT,
-}
+        data = response.json()
+        if not 'authTicket' in data['data']:
+            logging.error("Authentication failed")
+            sys.exit(1)
 
-LIBRELINKUP_TOKEN = None
-script_dir = os.path.dirname(__file__)
-auth_token_path = os.path.join(script_dir, '.librelinkup-authtoken')
-if os.path.isfile(auth_token_path):
-    with open(auth_token_path) as json_file:
-            auth = json.load(json_file)
-            if auth['expires'] > time.time():
-                LIBRELINKUP_TOKEN = auth['token']
-                logging.info("Using cached authTicket, expiration: %s", datetime.fromtimestamp(auth['expires']).isoformat())
+        with open(auth_token_path, 'w') as outfile:
+            json.dump(data['data']['authTicket'], outfile)
+
+        LIBRELINKUP_TOKEN = data['data']['authTicket']['token']
+
+    LIBRELINKUP_HEADERS['Authorization'] = 'Bearer ' + LIBRELINKUP_TOKEN
 
-if LIBRELINKUP_TOKEN is None:
-    logging.info("Auth ticket not found or expired, requesting a new one")
     try:
-        response = requests.post(f'{LIBRELINKUP_URL}/llu/auth/login',
-            headers=LIBRELINKUP_HEADERS, json = {'email': LIBRELINKUP_USERNAME, 'password': LIBRELINKUP_PASSWORD})
+        response = httpclient.get(f'{LIBRELINKUP_URL}/llu/connections', headers=LIBRELINKUP_HEADERS)
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         logging.error("HTTP request failed: %s", err)
         sys.exit(1)
 
-    data = response.json()
-    if not 'authTicket' in data['data']:
-        logging.error("Authentication failed")
+    connections = response.json()
+    if not 'data' in connections or len(connections['data']) < 1:
+        logging.error("No connections configured. Accept an invitation in the mobile app first.")
         sys.exit(1)
 
-    with open(auth_token_path, 'w') as outfile:
-        json.dump(data['data']['authTicket'], outfile)
-
-    LIBRELINKUP_TOKEN = data['data']['authTicket']['token']
+    logging.info("Using connection %s: %s %s", connections['data'][0]['patientId'], connections['data'][0]['firstName'], connections['data'][0]['lastName'])
 
-LIBRELINKUP_HEADERS['Authorization'] = 'Bearer ' + LIBRELINKUP_TOKEN
-
-try:
-    response = requests.get(f'{LIBRELINKUP_URL}/llu/connections', headers=LIBRELINKUP_HEADERS)
-    response.raise_for_status()
-except requests.exceptions.HTTPError as err:
-    logging.error("HTTP request failed: %s", err)
-    sys.exit(1)
-
-connections = response.json()
-if not 'data' in connections or len(connections['data']) < 1:
-    logging.error("No connections configured. Accept an invitation in the mobile app first.")
-    sys.exit(1)
+    try:
+        response = httpclient.get(f'{LIBRELINKUP_URL}/llu/connections/{connections["data"][0]["patientId"]}/graph', headers=LIBRELINKUP_HEADERS)
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        logging.error("HTTP request failed: %s", err)
+        sys.exit(1)
 
-logging.info("Using connection %s: %s %s", connections['data'][0]['patientId'], connections['data'][0]['firstName'], connections['data'][0]['lastName'])
+    data = response.json()
+    append_reading(points, data, data['data']['connection']['glucoseMeasurement'])
 
-try:
-    response = requests.get(f'{LIBRELINKUP_URL}/llu/connections/{connections["data"][0]["patientId"]}/graph', headers=LIBRELINKUP_HEADERS)
-    response.raise_for_status()
-except requests.exceptions.HTTPError as err:
-    logging.error("HTTP request failed: %s", err)
-    sys.exit(1)
+    if len(data['data']['graphData']) > 0:
+        for reading in data['data']['graphData']:
+            append_reading(points, data, reading)
 
-data = response.json()
-append_reading(points, data, data['data']['connection']['glucoseMeasurement'])
+    write_points(points)
 
-if len(data['data']['graphData']) > 0:
-    for reading in data['data']['graphData']:
-        append_reading(points, data, reading)
 
-write_points(points)
+if __name__ == "__main__":
+    main()
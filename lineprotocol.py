@@ -0,0 +1,167 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, timezone
+from dateutil.parser import parse
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EPOCH_NAIVE = datetime(1970, 1, 1)
+
+# Ordered from coarsest to finest, 'n' is only used for raw integer timestamps
+PRECISIONS = ('s', 'ms', 'u', 'n')
+_DIVISORS = {'s': 1000000, 'ms': 1000, 'u': 1}
+
+
+def escape_tag(value):
+    return str(value).replace('\\', '\\\\').replace(' ', '\\ ').replace(',', '\\,').replace('=', '\\=').replace('\n', '\\n')
+
+
+def escape_field_value(value):
+    # Empty strings are left out like None, as influxdb-python did before 5.3
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        return '"' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+    if isinstance(value, bool):
+        return 'True' if value else 'False'
+    if isinstance(value, int):
+        return str(value) + 'i'
+    if isinstance(value, float):
+        return repr(value)
+    try:
+        return repr(float(value))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def to_micros(time):
+    """Convert an ISO-8601 string or datetime into integer microseconds since the epoch (naive times are UTC)"""
+    if isinstance(time, str):
+        try:
+            time = datetime.fromisoformat(time[:-1] + '+00:00' if time.endswith('Z') else time)
+        except ValueError:
+            time = parse(time)
+
+    if time.tzinfo is None:
+        delta = time - EPOCH_NAIVE
+    else:
+        delta = time - EPOCH
+
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+class LineSerializer:
+    """Encodes point dicts straight into InfluxDB line protocol.
+
+    Escaped "measurement,tag=value" prefixes are cached per series and every
+    measurement is written with the coarsest precision that represents all of
+    its timestamps exactly, so daily data is sent in seconds and intraday data
+    in milliseconds.
+    """
+
+    def __init__(self, max_series=50000):
+        self.max_series = max_series
+        self._series = {}
+        self._field_keys = {}
+        self._precisions = {}
+
+    def series_prefix(self, measurement, tags):
+        if tags:
+            key = (measurement, tuple(sorted(tags.items())))
+        else:
+            key = (measurement, ())
+
+        prefix = self._series.get(key)
+        if prefix is None:
+            prefix = escape_tag(measurement)
+            for tag, value in key[1]:
+                if value is None:
+                    continue
+                value = escape_tag(value)
+                if tag != '' and value != '':
+                    prefix += ',' + escape_tag(tag) + '=' + value
+
+            if len(self._series) >= self.max_series:
+                self._series.clear()
+            self._series[key] = prefix
+
+        return prefix
+
+    def field_set(self, fields):
+        field_list = []
+        for key in sorted(fields):
+            value = escape_field_value(fields[key])
+            if value is None:
+                continue
+            escaped = self._field_keys.get(key)
+            if escaped is None:
+                escaped = self._field_keys[key] = escape_tag(key)
+            field_list.append(escaped + '=' + value)
+
+        return ','.join(field_list)
+
+    def precision_for(self, measurement, micros):
+        if micros % 1000000 == 0:
+            precision = 's'
+        elif micros % 1000 == 0:
+            precision = 'ms'
+        else:
+            precision = 'u'
+
+        current = self._precisions.get(measurement, 's')
+        if PRECISIONS.index(precision) > PRECISIONS.index(current):
+            self._precisions[measurement] = precision
+            return precision
+
+        return current
+
+    def encode(self, point):
+        """Returns (precision, series, fields, timestamp) for a point, timestamp is None if the point has no time"""
+        measurement = point['measurement']
+        series = self.series_prefix(measurement, point.get('tags'))
+        fields = self.field_set(point.get('fields') or {})
+
+        time = point.get('time')
+        if time is None:
+            return self._precisions.get(measurement, 's'), series, fields, None
+
+        if isinstance(time, int):
+            return 'n', series, fields, str(time)
+
+        micros = to_micros(time)
+        precision = self.precision_for(measurement, micros)
+        return precision, series, fields, str(micros // _DIVISORS[precision])
+
+    def serialize(self, point):
+        """Returns a (precision, line) tuple for a single point dict"""
+        precision, line, fields, timestamp = self.encode(point)
+        if fields:
+            line += ' ' + fields
+        if timestamp is not None:
+            line += ' ' + timestamp
+
+        return precision, line
+
+    def serialize_points(self, points):
+        """Serialize a list of points into a dict of precision -> list of lines"""
+        batches = {}
+        for point in points:
+            precision, line = self.serialize(point)
+            if precision in batches:
+                batches[precision].append(line)
+            else:
+                batches[precision] = [line]
+
+        return batches
@@ -13,19 +13,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys
+import httpclient, sys
 from config import *
 
-if not NS_DEVICE_ID:
-    logging.error("NS_DEVICE_ID not set in config.py")
-    sys.exit(1)
-
 GRANT_TYPE = 'urn:ietf:params:oauth:grant-type:jwt-bearer-session-token'
 points = []
 
 
 def get_access_token():
-    response = requests.post('https://accounts.nintendo.com/connect/1.0.0/api/token', data={
+    response = httpclient.post('https://accounts.nintendo.com/connect/1.0.0/api/token', data={
         'session_token': NS_SESSION_TOKEN,
         'client_id': NS_CLIENT_ID,
         'grant_type': GRANT_TYPE
@@ -34,7 +30,7 @@ def get_access_token():
 
 
 def get_daily_summary(access):
-    response = requests.get(f'https://api-lp1.pctl.srv.nintendo.net/moon/v1/devices/{NS_DEVICE_ID}/daily_summaries', headers={
+    response = httpclient.get(f'https://api-lp1.pctl.srv.nintendo.net/moon/v1/devices/{NS_DEVICE_ID}/daily_summaries', headers={
         'x-moon-os-language': 'en-US',
         'x-moon-app-language': 'en-US',
         'authorization': f"{access['token_type']} {access['access_token']}",
@@ -53,7 +49,7 @@ def get_daily_summary(access):
     return response.json()
 
 def get_monthly_summary(month, access):
-    response = requests.get(f'https://api-lp1.pctl.srv.nintendo.net/moon/v1/devices/{NS_DEVICE_ID}/monthly_summaries/{month}', headers={
+    response = httpclient.get(f'https://api-lp1.pctl.srv.nintendo.net/moon/v1/devices/{NS_DEVICE_ID}/monthly_summaries/{month}', headers={
         'x-moon-os-language': 'en-US',
         'x-moon-app-language': 'en-US',
         'authorization': f"{access['token_type']} {access['access_token']}",
@@ -71,30 +67,41 @@ def get_monthly_summary(month, access):
     })
     return response.json()
 
-connect(NS_DATABASE)
-token = get_access_token()
-summary = get_daily_summary(token)
+def main():
+    global points
+    if not NS_DEVICE_ID:
+        logging.error("NS_DEVICE_ID not set in config.py")
+        sys.exit(1)
+
+    points = []
+    connect(NS_DATABASE)
+    token = get_access_token()
+    summary = get_daily_summary(token)
+
+    for day in summary['items']:
+        for player in day['devicePlayers']:
+            for playedApp in player['playedApps']:
+                for app in day['playedApps']:
+                    if app['applicationId'] == playedApp['applicationId']:
+                        points.append({
+                                "measurement": "time",
+                                "time": day['date'],
+                                "tags": {
+                                    "player_id": player['playerId'],
+                                    "application_id": app['applicationId'],
+                                    "platform": "Nintendo Switch",
+                                    "player_name": player['nickname'],
+                                    "title": app['title'],
+                                },
+                                "fields": {
+                                    "value": playedApp['playingTime'],
+                                    "image": app['imageUri']['large'],
+                                    "url": app['shopUri']
+                                }
+                            })
+
+    write_points(points)
 
-for day in summary['items']:
-    for player in day['devicePlayers']:
-        for playedApp in player['playedApps']:
-            for app in day['playedApps']:
-                if app['applicationId'] == playedApp['applicationId']:
-                    points.append({
-                            "measurement": "time",
-                            "time": day['date'],
-                            "tags": {
-                                "player_id": player['playerId'],
-                                "application_id": app['applicationId'],
-                                "platform": "Nintendo Switch",
-                                "player_name": player['nickname'],
-                                "title": app['title'],
-                            },
-                            "fields": {
-                                "value": playedApp['playingTime'],
-                                "image": app['imageUri']['large'],
-                                "url": app['shopUri']
-                            }
-                        })
 
-write_points(points)
+if __name__ == "__main__":
+    main()
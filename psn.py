@@ -13,147 +13,124 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests
+import exophase
+import htmlextract
 import sys
 import json
 from datetime import datetime
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from concurrent.futures import ThreadPoolExecutor
 from config import *
 
 
-if not EXOPHASE_NAME:
-    logging.error("EXOPHASE_NAME not set in config.py")
-    sys.exit(1)
-
 points = []
+descriptions = {}
 
 
-def scrape_exophase_id():
-    try:
-        response = requests.get(
-            f"https://www.exophase.com/user/{EXOPHASE_NAME}")
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        logging.error("HTTP request failed: %s", err)
-        sys.exit(1)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    return [soup.find("a", attrs={'data-playerid': True})['data-playerid'], soup.find("div", attrs={'data-userid': True})['data-userid']]
-
-
-def scrape_latest_games(platform):
-    games = []
-    try:
-        response = requests.get(
-            f"https://www.exophase.com/{platform}/user/{PSN_NAME}")
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as err:
-        logging.error("HTTP request failed: %s", err)
-        sys.exit(1)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    for game in soup.find_all("li", attrs={'data-gameid': True}):
-        try:
-            playtime = int(float(game.select_one(
-                "span.hours").get_text()[:-1]) * 60)
-            img = game.select_one("div.image > img")['src']
-            img = urljoin(img, urlparse(img).path).replace(
-                "/games/m/", "/games/l/")
-            games.append({'gameid': game['data-gameid'],
-                          'time': datetime.fromtimestamp(float(game['data-lastplayed'])),
-                          'title': game.select_one("h3 > a").string,
-                          'url': game.select_one("h3 > a")['href'],
-                          'image': img,
-                          'playtime': playtime,
-                          })
-        except Exception:  # Games with out total played time
-            pass
-
-    return games
-
-
-def scrape_achievements(url, gameid):
-    achievements = []
+def load_descriptions():
     try:
-        response = requests.get(
-            f"https://api.exophase.com/public/player/{urlparse(url).fragment}/game/{gameid}/earned")
+        with open(PSN_TROPHY_CACHE, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
 
-        response.raise_for_status()
 
-        api_data = response.json()
+def save_descriptions():
+    with open(PSN_TROPHY_CACHE + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(descriptions, f)
+    os.replace(PSN_TROPHY_CACHE + '.tmp', PSN_TROPHY_CACHE)
 
-    except requests.exceptions.HTTPError as err:
-        logging.error("HTTP request failed: %s", err)
-        sys.exit(1)
 
-    if api_data['success'] == True:
-        achievement_data = {}
+def fetch_description(achievement):
+    soup = htmlextract.parse(exophase.get(achievement["endpoint"]).text, "div", {"class": "col award-details snippet"})
+    award = soup.find("div", {"class": "col award-details snippet"}).p
+    return award.text
 
-        for achievement in api_data['list']:
-            api_desc_response = requests.get(achievement["endpoint"])
-            soup = BeautifulSoup(api_desc_response.text, 'html.parser')
-            award = soup.find("div", {"class": "col award-details snippet"}).p
 
-            achievement_data = {'id': achievement['awardid'],
-                                'name': achievement["slug"].replace("-", " ").title(),
-                                'image': achievement["icons"]["o"],
-                                'time': datetime.fromtimestamp(achievement['timestamp']),
-                                'description': award.text
-                                }
-            achievements.append(achievement_data)
+def scrape_achievements(game):
+    achievements = []
+    earned = exophase.earned(game)
+    # Trophy descriptions never change, only fetch the ones we haven't seen before
+    missing = [achievement for achievement in earned if str(achievement['awardid']) not in descriptions]
+    if len(missing) > 0:
+        with ThreadPoolExecutor(max_workers=max(EXOPHASE_CONCURRENCY, 1)) as executor:
+            for achievement, description in zip(missing, executor.map(fetch_description, missing)):
+                descriptions[str(achievement['awardid'])] = description
+
+    for achievement in earned:
+        achievement_data = {'id': achievement['awardid'],
+                            'name': achievement["slug"].replace("-", " ").title(),
+                            'image': achievement["icons"]["o"],
+                            'time': datetime.fromtimestamp(achievement['timestamp']),
+                            'description': descriptions[str(achievement['awardid'])]
+                            }
+        achievements.append(achievement_data)
 
     return achievements
 
 
-client = connect(PSN_DATABASE)
-
-PLAYERID, USERID = scrape_exophase_id()
-totals = client.query(
-    f'SELECT last("total") AS "total" FROM "time" WHERE "platform" = \'PSN\' AND "total" > 0 AND "player_id" = \'{PLAYERID}\' GROUP BY "application_id" ORDER BY "time" DESC')
-
-for game in scrape_latest_games('psn'):
-    value = game['playtime']
-    total = list(totals.get_points(
-        tags={'application_id': str(game['gameid'])}))
-    if len(total) == 1 and total[0]['total'] > 0:
-        value = game['playtime'] - total[0]['total']
-    if value > 1:
-        points.append({
-            "measurement": "time",
-            "time": game['time'].isoformat(),
-            "tags": {
-                "player_id": PLAYERID,
-                "application_id": game['gameid'],
-                "platform": "PSN",
-                "player_name": PSN_NAME,
-                "title": game['title'],
-            },
-            "fields": {
-                "value": int(value) * 60,
-                "total": game['playtime'],
-                "image": game['image'],
-                "url": game['url']
-            }
-        })
-
-    for achievement in scrape_achievements(game['url'], game['gameid']):
-        points.append({
-            "measurement": "achievement",
-            "time": achievement['time'].isoformat(),
-            "tags": {
-                "player_id": PLAYERID,
-                "application_id": game['gameid'],
-                "apiname": achievement['id'],
-                "platform": "PSN",
-                "player_name": PSN_NAME,
-                "title": game['title'],
-            },
-            "fields": {
-                "name": achievement['name'],
-                "description": achievement['description'],
-                "icon": achievement['image'],
-                "icon_gray": achievement['image'],
-            }
-        })
-
-# print(points)
-write_points(points)
+def main():
+    global points, descriptions
+    if not EXOPHASE_NAME:
+        logging.error("EXOPHASE_NAME not set in config.py")
+        sys.exit(1)
+
+    points = []
+    descriptions = load_descriptions()
+    client = connect(PSN_DATABASE)
+
+    PLAYERID, USERID = exophase.player_ids()
+    totals = client.query(
+        f'SELECT last("total") AS "total" FROM "time" WHERE "platform" = \'PSN\' AND "total" > 0 AND "player_id" = \'{PLAYERID}\' GROUP BY "application_id" ORDER BY "time" DESC')
+
+    for game, achievements in exophase.fetch_games(exophase.latest_games('psn', PSN_NAME), scrape_achievements):
+        value = game['playtime']
+        total = list(totals.get_points(
+            tags={'application_id': str(game['gameid'])}))
+        if len(total) == 1 and total[0]['total'] > 0:
+            value = game['playtime'] - total[0]['total']
+        if value > 1:
+            points.append({
+                "measurement": "time",
+                "time": game['time'].isoformat(),
+                "tags": {
+                    "player_id": PLAYERID,
+                    "application_id": game['gameid'],
+                    "platform": "PSN",
+                    "player_name": PSN_NAME,
+                    "title": game['title'],
+                },
+                "fields": {
+                    "value": int(value) * 60,
+                    "total": game['playtime'],
+                    "image": game['image'],
+                    "url": game['url']
+                }
+            })
+
+        for achievement in achievements:
+            points.append({
+                "measurement": "achievement",
+                "time": achievement['time'].isoformat(),
+                "tags": {
+                    "player_id": PLAYERID,
+                    "application_id": game['gameid'],
+                    "apiname": achievement['id'],
+                    "platform": "PSN",
+                    "player_name": PSN_NAME,
+                    "title": game['title'],
+                },
+                "fields": {
+                    "name": achievement['name'],
+                    "description": achievement['description'],
+                    "icon": achievement['image'],
+                    "icon_gray": achievement['image'],
+                }
+            })
+
+    save_descriptions()
+    # print(points)
+    write_points(points)
+
+
+if __name__ == "__main__":
+    main()
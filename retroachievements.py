@@ -13,50 +13,56 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys
-from datetime import datetime, date, timedelta, time
+import requests, httpclient, sys
+from datetime import datetime
 from config import *
 
-if not RA_API_KEY:
-    logging.error("RA_API_KEY not set in config.py")
-    sys.exit(1)
-
-points = []
-connect(RA_DATABASE)
-
-end = datetime.utcnow().timestamp()
-start = end - 604800
-
-try:
-    response = requests.get('https://retroachievements.org/API/API_GetAchievementsEarnedBetween.php',
-        params={'z': RA_USERNAME, 'y': RA_API_KEY, 'u': RA_USERNAME, 'f': start, 't': end})
-    response.raise_for_status()
-except requests.exceptions.HTTPError as err:
-    logging.error("HTTP request failed: %s", err)
-    sys.exit(1)
-
-data = response.json()
-logging.info("Got %s achievements from RetroAchievements", len(data))
-
-for achievement in data:
-    date = datetime.strptime(achievement['Date'], "%Y-%m-%d %H:%M:%S")
-
-    points.append({
-            "measurement": "achievement",
-            "time": date.isoformat(),
-            "tags": {
-                "player_id": RA_USERNAME,
-                "platform": achievement['ConsoleName'],
-                "player_name": RA_USERNAME,
-                "title": achievement['GameTitle'],
-                "application_id": str(achievement['GameID']),
-                "apiname": str(achievement['AchievementID']),
-            },
-            "fields": {
-                "name": achievement['Title'],
-                "description": achievement['Description'],
-                "icon": f'https://retroachievements.org{achievement["BadgeURL"]}'
-            }
-    })
-
-write_points(points)
+def main():
+    if not RA_API_KEY:
+        logging.error("RA_API_KEY not set in config.py")
+        sys.exit(1)
+
+    points = []
+    connect(RA_DATABASE)
+
+    end = datetime.utcnow().timestamp()
+    start = state.get('retroachievements', 'end', end - 604800)
+
+    try:
+        response = httpclient.get('https://retroachievements.org/API/API_GetAchievementsEarnedBetween.php',
+            params={'z': RA_USERNAME, 'y': RA_API_KEY, 'u': RA_USERNAME, 'f': start, 't': end})
+        response.raise_for_status()
+    except requests.exceptions.HTTPError as err:
+        logging.error("HTTP request failed: %s", err)
+        sys.exit(1)
+
+    data = response.json()
+    logging.info("Got %s achievements from RetroAchievements", len(data))
+
+    for achievement in data:
+        date = datetime.strptime(achievement['Date'], "%Y-%m-%d %H:%M:%S")
+
+        points.append({
+                "measurement": "achievement",
+                "time": date.isoformat(),
+                "tags": {
+                    "player_id": RA_USERNAME,
+                    "platform": achievement['ConsoleName'],
+                    "player_name": RA_USERNAME,
+                    "title": achievement['GameTitle'],
+                    "application_id": str(achievement['GameID']),
+                    "apiname": str(achievement['AchievementID']),
+                },
+                "fields": {
+                    "name": achievement['Title'],
+                    "description": achievement['Description'],
+                    "icon": f'https://retroachievements.org{achievement["BadgeURL"]}'
+                }
+        })
+
+    write_points(points)
+    state.set('retroachievements', 'end', end)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, json, fcntl
+
+
+class Spool:
+    """Append-only write-ahead log of line protocol batches.
+
+    Records are appended to numbered segment files, one JSON document per
+    line. Each segment has a sidecar .ack file holding the byte offset up to
+    which its records have been acknowledged by InfluxDB; fully acknowledged
+    segments are deleted by compact(). File locks make it safe for several
+    collectors to append while one process drains.
+    """
+
+    def __init__(self, path, segment_bytes=8388608):
+        self.path = path
+        self.segment_bytes = segment_bytes
+        os.makedirs(path, exist_ok=True)
+
+    def _lock(self, name, blocking=True):
+        lock = open(os.path.join(self.path, name), 'a')
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+    def _ack_path(self, segment):
+        return os.path.join(self.path, segment[:-4] + '.ack')
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.path) if name.endswith('.log'))
+
+    def _truncate_partial(self, path):
+        """Cut off a record left half written by a crash, so the next append starts on a new line"""
+        with open(path, 'r+b') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(position - 65536, 0)
+                f.seek(start)
+                block = f.read(position - start)
+                newline = block.rfind(b'\n')
+                if newline != -1:
+                    position = start + newline + 1
+                    break
+                position = start
+            if position < end:
+                f.truncate(position)
+
+    def append(self, database, precision, lines, digests=None):
+        """Spool lines, digests optionally holds the dedup digest (or None) of each line"""
+        record = {'db': database, 'precision': precision, 'lines': lines}
+        if digests is not None:
+            record['digests'] = digests
+        record = json.dumps(record, separators=(',', ':')) + '\n'
+        lock = self._lock('append.lock')
+        try:
+            segments = self.segments()
+            if segments:
+                self._truncate_partial(os.path.join(self.path, segments[-1]))
+            if segments and os.path.getsize(os.path.join(self.path, segments[-1])) < self.segment_bytes:
+                segment = segments[-1]
+            elif segments:
+                segment = '%020d.log' % (int(segments[-1][:-4]) + 1)
+            else:
+                segment = '%020d.log' % 1
+
+            with open(os.path.join(self.path, segment), 'a', encoding='utf-8') as f:
+                f.write(record)
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            lock.close()
+
+    def acked(self, segment):
+        try:
+            with open(self._ack_path(segment)) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def ack(self, segment, offset):
+        path = self._ack_path(segment)
+        with open(path + '.tmp', 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+
+    def replay(self):
+        """Yields (segment, offset, record) for every unacknowledged record, offset is the end of the record.
+
+        A line that can't be parsed (e.g. a crashed append that a later append
+        ran into) is yielded as {'corrupt': line} so it can be set aside and
+        acknowledged instead of blocking the spool forever.
+        """
+        for segment in self.segments():
+            offset = self.acked(segment)
+            try:
+                f = open(os.path.join(self.path, segment), 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                f.seek(offset)
+                for raw in f:
+                    if not raw.endswith(b'\n'):
+                        break
+                    offset += len(raw)
+                    try:
+                        record = json.loads(raw)
+                    except ValueError:
+                        record = {'corrupt': raw.decode('utf-8', errors='replace').rstrip('\n')}
+                    yield segment, offset, record
+
+    def compact(self):
+        lock = self._lock('append.lock')
+        try:
+            for segment in self.segments():
+                path = os.path.join(self.path, segment)
+                if self.acked(segment) >= os.path.getsize(path):
+                    os.remove(path)
+                    if os.path.exists(self._ack_path(segment)):
+                        os.remove(self._ack_path(segment))
+        finally:
+            lock.close()
+
+    def lock_drain(self):
+        """Returns a lock held while draining, or None if another process is already draining"""
+        return self._lock('drain.lock', blocking=False)
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sqlite3, threading
+
+
+class SystemCache:
+    """Persistent table of Elite Dangerous star systems looked up on EDSM.
+
+    Systems don't move, so coordinates and primary star type are kept
+    forever. Names are matched case-insensitively, like EDSM does.
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS systems (
+            key TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            x REAL NOT NULL,
+            y REAL NOT NULL,
+            z REAL NOT NULL,
+            primary_star TEXT)''')
+
+    def get_many(self, names):
+        """Returns a dict of lowercased name -> system for the names that are stored"""
+        found = {}
+        keys = list({name.lower() for name in names})
+        with self._lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(f'SELECT key, name, x, y, z, primary_star FROM systems WHERE key IN ({",".join("?" * len(chunk))})', chunk)
+                for key, name, x, y, z, primary_star in rows:
+                    found[key] = {'name': name, 'x': x, 'y': y, 'z': z, 'primary_star': primary_star}
+        return found
+
+    def put_many(self, systems):
+        """Store systems as returned by the EDSM API with showCoordinates and showPrimaryStar, returns them by lowercased name"""
+        stored = {}
+        for system in systems:
+            if 'coords' not in system:
+                continue
+            primary_star = system.get('primaryStar') or {}
+            stored[system['name'].lower()] = {
+                'name': system['name'],
+                'x': float(system['coords']['x']),
+                'y': float(system['coords']['y']),
+                'z': float(system['coords']['z']),
+                'primary_star': primary_star.get('type')
+            }
+
+        with self._lock:
+            self._db.execute('BEGIN')
+            self._db.executemany('INSERT OR REPLACE INTO systems VALUES (?, ?, ?, ?, ?, ?)',
+                ((key, s['name'], s['x'], s['y'], s['z'], s['primary_star']) for key, s in stored.items()))
+            self._db.execute('COMMIT')
+        return stored
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, json, fcntl, threading
+
+
+class StateStore:
+    """Per-collector checkpoints (cursors, last timestamps, last ids) kept in a JSON file.
+
+    Every set() re-reads the file under an exclusive file lock and replaces it
+    atomically, so collectors running as separate cron jobs don't overwrite
+    each other's checkpoints. With full=True get() always returns the default,
+    which makes collectors fetch everything again while still saving new
+    checkpoints.
+    """
+
+    def __init__(self, path, full=False):
+        self.path = path
+        self.full = full
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, collector, key, default=None):
+        if self.full:
+            return default
+        with self._lock:
+            return self._load().get(collector, {}).get(key, default)
+
+    def set(self, collector, key, value):
+        with self._lock, open(self.path + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            data = self._load()
+            data.setdefault(collector, {})[key] = value
+            with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=4, sort_keys=True)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(self.path + '.tmp', self.path)
@@ -13,21 +13,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, sys, re, json
+import requests, httpclient, htmlextract, sys, re, json
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from bs4 import BeautifulSoup
 from config import *
 
-if not STEAM_API_KEY:
-    logging.error("STEAM_API_KEY not set in config.py")
-    sys.exit(1)
-
 points = []
 
 def fetch_schema(appId):
     try:
-        response = requests.get('https://api.steampowered.com/ISteamUserStats/GetSchemaForGame/v1/', 
-            params={'key': STEAM_API_KEY, 'steamid': STEAM_ID, 'appid': appId, 'l': STEAM_LANGUAGE})
+        response = httpclient.get('https://api.steampowered.com/ISteamUserStats/GetSchemaForGame/v1/', 
+            params={'key': STEAM_API_KEY, 'appid': appId, 'l': STEAM_LANGUAGE})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         logging.error("HTTP request failed: %s", err)
@@ -40,7 +36,7 @@ def fetch_schema(appId):
 
 def fetch_achievements(appId):
     try:
-        response = requests.get('https://api.steampowered.com/ISteamUserStats/GetPlayerAchievements/v1/', 
+        response = httpclient.get('https://api.steampowered.com/ISteamUserStats/GetPlayerAchievements/v1/', 
             params={'key': STEAM_API_KEY, 'steamid': STEAM_ID, 'appid': appId})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
@@ -55,7 +51,7 @@ def fetch_achievements(appId):
 
 def fetch_recents():
     try:
-        response = requests.get('https://api.steampowered.com/IPlayerService/GetRecentlyPlayedGames/v1/',
+        response = httpclient.get('https://api.steampowered.com/IPlayerService/GetRecentlyPlayedGames/v1/',
             params={'key': STEAM_API_KEY, 'steamid': STEAM_ID})
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
@@ -70,72 +66,115 @@ def fetch_recents():
 
 def scrape_recents():
     try:
-        response = requests.get(f'https://steamcommunity.com/id/{STEAM_USERNAME}/games/?tab=all')
+        response = httpclient.get(f'https://steamcommunity.com/id/{STEAM_USERNAME}/games/?tab=all')
         response.raise_for_status()
     except requests.exceptions.HTTPError as err:
         logging.error("HTTP request failed: %s", err)
         sys.exit(1)
-    soup = BeautifulSoup(response.text, 'html.parser')
+    soup = htmlextract.parse(response.text, 'script')
     data = soup.find('script', string=re.compile('var rgGames = \[\{')).string
     return json.loads(data[data.index('['):data.index('}}];') + 3])
 
-client = connect(STEAM_DATABASE)
-
-totals = client.query(f'SELECT last("total") AS "total" FROM "time" WHERE "platform" = \'Steam\' AND "total" > 0 AND "player_id" = \'{STEAM_ID}\' GROUP BY "application_id" ORDER BY "time" DESC')
-recents = scrape_recents()
-
-for app in fetch_recents():
-    for recent in recents:
-        if recent['appid'] == app['appid']:
-            value = app['playtime_2weeks']
-            total = list(totals.get_points(tags={'application_id': str(app['appid'])}))
-            if len(total) == 1 and total[0]['total'] > 0:
-                value = app['playtime_forever'] - total[0]['total']
-            if value > 1:
-                points.append({
-                    "measurement": "time",
-                    "time": datetime.fromtimestamp(recent['last_played']).isoformat(),
+def fetch_last_played():
+    """Returns a dict of appid -> when it was last played, from the owned games API or the community profile page"""
+    try:
+        response = httpclient.get('https://api.steampowered.com/IPlayerService/GetOwnedGames/v1/',
+            params={'key': STEAM_API_KEY, 'steamid': STEAM_ID, 'include_played_free_games': 1})
+        response.raise_for_status()
+        games = response.json().get('response', {}).get('games', [])
+    except requests.exceptions.HTTPError as err:
+        logging.warning("Unable to fetch owned games, falling back to the community profile: %s", err)
+        games = []
+
+    last_played = {game['appid']: game['rtime_last_played'] for game in games if game.get('rtime_last_played')}
+    if len(last_played) == 0:
+        last_played = {recent['appid']: recent['last_played'] for recent in scrape_recents()}
+    return last_played
+
+def fetch_app_achievements(app):
+    schema = fetch_schema(app['appid'])
+    if 'availableGameStats' not in schema or 'achievements' not in schema['availableGameStats']:
+        return []
+
+    achievements = {achievement['name']: achievement for achievement in schema['availableGameStats']['achievements']}
+    points = []
+    for achievement in fetch_achievements(app['appid']):
+        if achievement['unlocktime'] > 0 and achievement['apiname'] in achievements:
+            info = achievements[achievement['apiname']]
+            points.append({
+                    "measurement": "achievement",
+                    "time": datetime.fromtimestamp(achievement['unlocktime']).isoformat(),
                     "tags": {
                         "player_id": STEAM_ID,
                         "application_id": app['appid'],
+                        "apiname":achievement['apiname'],
                         "platform": "Steam",
                         "player_name": STEAM_USERNAME,
                         "title": app['name'],
                     },
                     "fields": {
-                        "value": int(value) * 60,
-                        "total": app['playtime_forever'],
-                        "image": f"https://steamcdn-a.akamaihd.net/steam/apps/{app['appid']}/header.jpg",
-                        "url": f"https://store.steampowered.com/app/{app['appid']}/"
+                        "name": info['displayName'],
+                        "description": info.get('description'),
+                        "icon": info['icon'],
+                        "icon_gray": info['icongray'],
                     }
                 })
 
-            schema = fetch_schema(app['appid'])
-            if 'availableGameStats' in schema and 'achievements' in schema['availableGameStats']:
-                achievements = schema['availableGameStats']['achievements']
-                for achievement in fetch_achievements(app['appid']):
-                    if achievement['unlocktime'] > 0:
-                        description = None
-                        if 'description' in achievements[achievement['apiname']]:
-                            description = achievements[achievement['apiname']]['description']
-
-                        points.append({
-                                "measurement": "achievement",
-                                "time": datetime.fromtimestamp(achievement['unlocktime']).isoformat(),
-                                "tags": {
-                                    "player_id": STEAM_ID,
-                                    "application_id": app['appid'],
-                                    "apiname":achievement['apiname'],
-                                    "platform": "Steam",
-                                    "player_name": STEAM_USERNAME,
-                                    "title": app['name'],
-                                },
-                                "fields": {
-                                    "name": achievements[achievement['apiname']]['displayName'],
-                                    "description": description,
-                                    "icon": achievements[achievement['apiname']]['icon'],
-                                    "icon_gray": achievements[achievement['apiname']]['icongray'],
-                                }
-                            })
-
-write_points(points)
+    return points
+
+def main():
+    global points
+    if not STEAM_API_KEY:
+        logging.error("STEAM_API_KEY not set in config.py")
+        sys.exit(1)
+
+    points = []
+    client = connect(STEAM_DATABASE)
+
+    totals = client.query(f'SELECT last("total") AS "total" FROM "time" WHERE "platform" = \'Steam\' AND "total" > 0 AND "player_id" = \'{STEAM_ID}\' GROUP BY "application_id" ORDER BY "time" DESC')
+    last_played = fetch_last_played()
+    playtimes = state.get('steam', 'playtime', {})
+    changed = []
+
+    for app in fetch_recents():
+        if app['appid'] not in last_played:
+            continue
+
+        value = app['playtime_2weeks']
+        total = list(totals.get_points(tags={'application_id': str(app['appid'])}))
+        if len(total) == 1 and total[0]['total'] > 0:
+            value = app['playtime_forever'] - total[0]['total']
+        if value > 1:
+            points.append({
+                "measurement": "time",
+                "time": datetime.fromtimestamp(last_played[app['appid']]).isoformat(),
+                "tags": {
+                    "player_id": STEAM_ID,
+                    "application_id": app['appid'],
+                    "platform": "Steam",
+                    "player_name": STEAM_USERNAME,
+                    "title": app['name'],
+                },
+                "fields": {
+                    "value": int(value) * 60,
+                    "total": app['playtime_forever'],
+                    "image": f"https://steamcdn-a.akamaihd.net/steam/apps/{app['appid']}/header.jpg",
+                    "url": f"https://store.steampowered.com/app/{app['appid']}/"
+                }
+            })
+
+        if playtimes.get(str(app['appid'])) != app['playtime_forever']:
+            changed.append(app)
+
+    # Achievements can only have been unlocked in games that were played since the last run
+    with ThreadPoolExecutor(max_workers=STEAM_CONCURRENCY) as executor:
+        for app, achievements in zip(changed, executor.map(fetch_app_achievements, changed)):
+            points.extend(achievements)
+            playtimes[str(app['appid'])] = app['playtime_forever']
+
+    write_points(points)
+    state.set('steam', 'playtime', playtimes)
+
+
+if __name__ == "__main__":
+    main()
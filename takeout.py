@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Readers for Google Takeout archives and parsers for the Google Play Games
+# pages in them. They live in their own module so google-play.py can run the
+# parsers in worker processes.
+
+import tarfile, zipfile
+from datetime import datetime
+import htmlextract
+
+
+def members(path, prefix):
+    """Yields (name, mtime, size, read) for the files under prefix in a .zip or .tgz archive.
+
+    Nothing is extracted to disk and only the matching members are
+    decompressed, read() returns the contents of the current member. Gzipped
+    tarballs are read as a stream, so read() has to be called before moving on
+    to the next member.
+    """
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if info.filename.startswith(prefix) and not info.is_dir():
+                    yield info.filename, datetime(*info.date_time).timestamp(), info.file_size, lambda info=info: archive.read(info)
+    else:
+        with tarfile.open(path, 'r|*') as archive:
+            for info in archive:
+                name = info.name[2:] if info.name.startswith('./') else info.name
+                if name.startswith(prefix) and info.isfile():
+                    yield name, info.mtime, info.size, lambda info=info: archive.extractfile(info).read()
+
+
+def parse_activity(game, data):
+    points = []
+    html = htmlextract.parse(data, 'tr')
+
+    for row in html.find_all('tr'):
+        if row.contents[0].name == 'td' and row.contents[0].string == 'Time Last Played':
+            points.append({
+                    "measurement": "time",
+                    "time": str(row.contents[1].string),
+                    "tags": {
+                        "platform": "Google Play",
+                        "title": game,
+                    },
+                    "fields": {
+                        "value": 0
+                    }
+                })
+    return points
+
+def parse_achievements(game, data):
+    points = []
+    html = htmlextract.parse(data, 'tr')
+
+    for row in html.find_all('tr'):
+        if row.contents[0].name == 'td' and row.contents[0].string == 'Achievement unlocked':
+            date = str(row.contents[2].string)
+            game = str(row.contents[6].string)
+            achievement = row.contents[1].string.title()
+            apiname = str(row.contents[1].string)
+
+            points.append({
+                    "measurement": "achievement",
+                    "time": date,
+                    "tags": {
+                        "platform": "Google Play",
+                        "title": game,
+                        "apiname": apiname
+                    },
+                    "fields": {
+                        "name": achievement
+                    }
+                })
+    return points
+
+PARSERS = {
+    'Activity.html': parse_activity,
+    'Experience.html': parse_achievements,
+}
+
+def parse(game, name, data):
+    """Returns the points in one of a game's Takeout pages, name is the file name and data its contents"""
+    return PARSERS[name](game, data)
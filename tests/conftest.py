@@ -0,0 +1,29 @@
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os, sys, tempfile
+
+# The collectors and their helper modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep anything config.py creates on import out of the working tree
+_tmp = tempfile.mkdtemp(prefix='personal-influxdb-tests-')
+for name, value in {
+    'STATE_FILE': os.path.join(_tmp, 'state.json'),
+    'INFLUXDB_SPOOL_DIR': os.path.join(_tmp, 'spool'),
+    'INFLUXDB_QUARANTINE_FILE': os.path.join(_tmp, 'quarantine'),
+    'INFLUXDB_DEDUP_FILE': os.path.join(_tmp, 'dedup.sqlite'),
+    'HTTP_CACHE_FILE': os.path.join(_tmp, 'http-cache.sqlite'),
+}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,56 @@
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+from batching import AdaptiveBatcher
+
+
+def test_takes_up_to_the_current_batch_size():
+    batcher = AdaptiveBatcher(initial_points=3, max_points=10, max_bytes=1000)
+    lines = ['m v=1i'] * 10
+    assert batcher.take(lines, 0, 10) == 3
+    assert batcher.take(lines, 8, 10) == 10
+
+
+def test_byte_limit_counts_the_newline():
+    batcher = AdaptiveBatcher(initial_points=10, max_points=10, max_bytes=20)
+    # 9 bytes plus a newline each
+    assert batcher.take(['m v=1i 12'] * 5, 0, 5) == 2
+
+
+def test_byte_limit_counts_utf8_bytes():
+    batcher = AdaptiveBatcher(initial_points=10, max_points=10, max_bytes=30)
+    ascii_lines = ['m t=aaaaaaaa'] * 5
+    accented_lines = ['m t=éééééééé'] * 5
+    assert len(ascii_lines[0]) == len(accented_lines[0])
+    assert batcher.take(ascii_lines, 0, 5) == 2
+    assert batcher.take(accented_lines, 0, 5) == 1
+
+
+def test_oversized_line_is_sent_on_its_own():
+    batcher = AdaptiveBatcher(initial_points=10, max_points=10, max_bytes=5)
+    assert batcher.take(['m v="' + 'x' * 100 + '"', 'm v=1i'], 0, 2) == 1
+
+
+def test_batch_size_adapts_to_latency():
+    batcher = AdaptiveBatcher(initial_points=4, max_points=16, target_latency=1.0)
+    batcher.record(4, 0.1)
+    assert batcher.points == 8
+    batcher.record(2, 0.1)
+    assert batcher.points == 8
+    batcher.record(8, 5.0)
+    assert batcher.points == 4
+    for _ in range(10):
+        batcher.shrink()
+    assert batcher.points == 1
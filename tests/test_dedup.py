@@ -0,0 +1,114 @@
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import pytest, requests
+import dedup as dedup_module
+from dedup import DedupIndex
+from spool import Spool
+
+
+def test_digest_depends_on_series_time_and_fields(tmp_path):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite'))
+    key, value = index.digest('db', 's', 'm,t=a', '1', 'v=1i')
+    assert index.digest('db', 's', 'm,t=a', '1', 'v=1i') == (key, value)
+    changed_key, changed_value = index.digest('db', 's', 'm,t=a', '1', 'v=2i')
+    assert changed_key == key and changed_value != value
+    assert index.digest('db', 's', 'm,t=b', '1', 'v=1i')[0] != key
+    assert index.digest('db', 's', 'm,t=a', '2', 'v=1i')[0] != key
+    assert index.digest('other', 's', 'm,t=a', '1', 'v=1i')[0] != key
+
+
+def test_unchanged_only_matches_the_same_values(tmp_path):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite'))
+    written = index.digest('db', 's', 'm', '1', 'v=1i')
+    changed = index.digest('db', 's', 'm', '1', 'v=2i')
+    new = index.digest('db', 's', 'm', '2', 'v=1i')
+    index.record([written])
+    assert index.unchanged([written, new]) == {written[0]}
+    assert index.unchanged([changed]) == set()
+
+
+def test_entries_expire(tmp_path, monkeypatch):
+    index = DedupIndex(str(tmp_path / 'dedup.sqlite'), max_age=60)
+    old = index.digest('db', 's', 'm', '1', 'v=1i')
+    new = index.digest('db', 's', 'm', '2', 'v=1i')
+    monkeypatch.setattr(dedup_module.time, 'time', lambda: 1000.0)
+    index.record([old])
+    monkeypatch.setattr(dedup_module.time, 'time', lambda: 1100.0)
+    index.record([new])
+    assert index.unchanged([old, new]) == {new[0]}
+
+
+class Client:
+    """Stands in for InfluxDBClient, rejects lines containing BAD like InfluxDB does with a 400"""
+
+    def __init__(self, up=True):
+        self._database = 'db'
+        self.up = up
+        self.written = []
+
+    def create_database(self, database):
+        pass
+
+    def write_points(self, lines, **kwargs):
+        if not self.up:
+            raise requests.exceptions.ConnectionError('InfluxDB is down')
+        if any('BAD' in line for line in lines):
+            from influxdb.exceptions import InfluxDBClientError
+            raise InfluxDBClientError('partial write', 400)
+        self.written.extend(lines)
+
+
+POINTS = [{'measurement': 'm', 'tags': {'t': tag}, 'fields': {'v': 1}, 'time': '2022-01-01T00:00:00Z'} for tag in ('a', 'BAD', 'b')]
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch):
+    import config
+    monkeypatch.setattr(config, 'dedup', DedupIndex(str(tmp_path / 'dedup.sqlite')))
+    monkeypatch.setattr(config, 'spool', Spool(str(tmp_path / 'spool')))
+    monkeypatch.setattr(config, 'INFLUXDB_QUARANTINE_FILE', str(tmp_path / 'quarantine'))
+    monkeypatch.setattr(config, '_start_drain', lambda: None)
+    monkeypatch.setattr(config.state, 'full', False)
+    return config
+
+
+def test_direct_writes_record_only_accepted_points(config):
+    client = Client()
+    assert config._flush(client, POINTS) == (2, 0, 1, 0)
+    # The rejected point is tried again, the accepted ones are skipped
+    assert config._flush(client, POINTS) == (0, 2, 1, 0)
+
+
+def test_failed_direct_writes_are_not_recorded(config):
+    assert config._flush(Client(up=False), POINTS[:1])[3] == 1
+    assert config._flush(Client(), POINTS[:1]) == (1, 0, 0, 0)
+
+
+def test_spooled_points_are_recorded_after_the_drain(config, monkeypatch):
+    monkeypatch.setattr(config, 'INFLUXDB_SPOOL', True)
+    assert config._flush(Client(), POINTS) == (3, 0, 0, 0)
+    # Nothing is recorded until InfluxDB accepted the points
+    assert config._flush(Client(), POINTS) == (3, 0, 0, 0)
+
+    monkeypatch.setattr(config, '_new_client', lambda: Client(up=False))
+    assert not config.drain_spool(concurrency=1)
+    assert config._flush(Client(), POINTS)[1] == 0
+
+    client = Client()
+    monkeypatch.setattr(config, '_new_client', lambda: client)
+    assert config.drain_spool(concurrency=1)
+    assert len(client.written) == 6
+    assert config._flush(Client(), POINTS) == (1, 2, 0, 0)
@@ -0,0 +1,74 @@
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from datetime import datetime, timezone
+from lineprotocol import LineSerializer, escape_field_value, to_micros
+
+
+def test_escapes_measurement_and_tags():
+    serializer = LineSerializer()
+    precision, line = serializer.serialize({
+        'measurement': 'play time',
+        'tags': {'title': 'Half-Life 2, Episode=1', 'path': 'C:\\Games', 'empty': '', 'missing': None},
+        'fields': {'value': 1},
+        'time': '2022-01-01T00:00:00Z',
+    })
+    assert line == 'play\\ time,path=C:\\\\Games,title=Half-Life\\ 2\\,\\ Episode\\=1 value=1i 1640995200'
+    assert precision == 's'
+
+
+def test_field_values():
+    assert escape_field_value('say "hi"\\\n') == '"say \\"hi\\"\\\\\\n"'
+    assert escape_field_value(3) == '3i'
+    assert escape_field_value(True) == 'True'
+    assert escape_field_value(1.5) == '1.5'
+    assert escape_field_value(None) is None
+    assert escape_field_value('') is None
+
+
+def test_fields_are_sorted_and_none_dropped():
+    serializer = LineSerializer()
+    _, line = serializer.serialize({'measurement': 'm', 'fields': {'b': 'x', 'a': 2.0, 'c': None}, 'time': 0})
+    assert line == 'm a=2.0,b="x" 0'
+
+
+def test_empty_string_fields_dropped():
+    serializer = LineSerializer()
+    _, line = serializer.serialize({'measurement': 'm', 'fields': {'name': '', 'value': 0}, 'time': 0})
+    assert line == 'm value=0i 0'
+
+
+def test_naive_and_utc_times_match():
+    assert to_micros('2022-01-01T00:00:00Z') == to_micros(datetime(2022, 1, 1)) == to_micros(datetime(2022, 1, 1, tzinfo=timezone.utc))
+    assert to_micros('2022-01-01T00:00:00.123456+00:00') == 1640995200123456
+
+
+def test_precision_is_the_coarsest_exact_one():
+    serializer = LineSerializer()
+    assert serializer.serialize({'measurement': 'daily', 'fields': {'v': 1}, 'time': '2022-01-01T00:00:00Z'}) == ('s', 'daily v=1i 1640995200')
+    assert serializer.serialize({'measurement': 'steps', 'fields': {'v': 1}, 'time': '2022-01-01T00:00:00.250Z'}) == ('ms', 'steps v=1i 1640995200250')
+    assert serializer.serialize({'measurement': 'hr', 'fields': {'v': 1}, 'time': '2022-01-01T00:00:00.000001Z'}) == ('u', 'hr v=1i 1640995200000001')
+    assert serializer.serialize({'measurement': 'raw', 'fields': {'v': 1}, 'time': 1640995200000000000}) == ('n', 'raw v=1i 1640995200000000000')
+
+
+def test_precision_only_gets_finer_per_measurement():
+    serializer = LineSerializer()
+    serializer.serialize({'measurement': 'm', 'fields': {'v': 1}, 'time': '2022-01-01T00:00:00.5Z'})
+    assert serializer.serialize({'measurement': 'm', 'fields': {'v': 1}, 'time': '2022-01-01T00:00:01Z'}) == ('ms', 'm v=1i 1640995201000')
+
+
+def test_point_without_time():
+    serializer = LineSerializer()
+    assert serializer.encode({'measurement': 'm', 'fields': {'v': 1}}) == ('s', 'm', 'v=1i', None)
+    assert serializer.serialize_points([{'measurement': 'm', 'fields': {'v': 1}}]) == {'s': ['m v=1i']}
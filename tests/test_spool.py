@@ -0,0 +1,100 @@
+# Copyright 2022 Sam Steele
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import os
+from spool import Spool
+
+
+def records(spool):
+    return [(segment, offset, record) for segment, offset, record in spool.replay()]
+
+
+def test_replay_resumes_after_ack(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append('db', 's', ['m v=1i 1'])
+    spool.append('db', 'ms', ['m v=2i 2000'], [[1, 2]])
+    first, second = records(spool)
+    assert first[2] == {'db': 'db', 'precision': 's', 'lines': ['m v=1i 1']}
+    assert second[2] == {'db': 'db', 'precision': 'ms', 'lines': ['m v=2i 2000'], 'digests': [[1, 2]]}
+
+    spool.ack(first[0], first[1])
+    assert records(spool) == [second]
+    spool.ack(second[0], second[1])
+    assert records(spool) == []
+
+
+def test_compact_removes_acknowledged_segments(tmp_path):
+    spool = Spool(str(tmp_path), segment_bytes=1)
+    spool.append('db', 's', ['m v=1i 1'])
+    spool.append('db', 's', ['m v=2i 2'])
+    assert len(spool.segments()) == 2
+
+    segment, offset, _ = records(spool)[0]
+    spool.ack(segment, offset)
+    spool.compact()
+    assert len(spool.segments()) == 1
+    assert [record['lines'] for _, _, record in records(spool)] == [['m v=2i 2']]
+
+
+def test_append_cuts_off_a_partial_record(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append('db', 's', ['m v=1i 1'])
+    with open(os.path.join(str(tmp_path), spool.segments()[-1]), 'a') as f:
+        f.write('{"db":"db","preci')
+
+    # The partial record isn't replayed, and doesn't corrupt the next one
+    assert len(records(spool)) == 1
+    spool.append('db', 's', ['m v=2i 2'])
+    assert [record['lines'] for _, _, record in records(spool)] == [['m v=1i 1'], ['m v=2i 2']]
+
+
+def test_replay_skips_past_corrupt_records(tmp_path):
+    spool = Spool(str(tmp_path))
+    spool.append('db', 's', ['m v=1i 1'])
+    with open(os.path.join(str(tmp_path), spool.segments()[-1]), 'a') as f:
+        f.write('{"db":"db","preci{"db":"db","precision":"s","lines":["m v=2i 2"]}\n')
+    spool.append('db', 's', ['m v=3i 3'])
+
+    replayed = records(spool)
+    assert 'corrupt' in replayed[1][2]
+    assert replayed[2][2]['lines'] == ['m v=3i 3']
+
+    # Acknowledging the corrupt record lets replay continue after it
+    spool.ack(replayed[1][0], replayed[1][1])
+    assert records(spool) == replayed[2:]
+
+
+def test_drain_quarantines_corrupt_records(tmp_path, monkeypatch):
+    import config
+    spool = Spool(str(tmp_path / 'spool'))
+    spool.append('db', 's', ['m v=1i 1'])
+    with open(os.path.join(spool.path, spool.segments()[-1]), 'a') as f:
+        f.write('not json\n')
+    spool.append('db', 's', ['m v=2i 2'])
+
+    written = []
+    class Client:
+        def create_database(self, database):
+            pass
+        def write_points(self, lines, **kwargs):
+            written.extend(lines)
+
+    monkeypatch.setattr(config, 'spool', spool)
+    monkeypatch.setattr(config, '_new_client', Client)
+    monkeypatch.setattr(config, 'INFLUXDB_QUARANTINE_FILE', str(tmp_path / 'quarantine'))
+    assert config.drain_spool(concurrency=1)
+    assert written == ['m v=1i 1', 'm v=2i 2']
+    assert 'not json' in (tmp_path / 'quarantine').read_text()
+    assert spool.segments() == []
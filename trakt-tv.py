@@ -13,26 +13,21 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests, requests_cache, sys, os, json
+import requests, httpclient, sys, os, json
 from datetime import datetime, date
 from trakt import Trakt
 from trakt.objects import Episode, Movie
 from config import *
 
-if not TRAKT_CLIENT_ID:
-    logging.error("TRAKT_CLIENT_ID not set in config.py")
-    sys.exit(1)
-
-points = []
 posters = {}
+watched_at = None
 
 def fetch_poster(type, tmdb_id):
 	if tmdb_id == None:
 		return None
 	logging.debug("Fetching poster for type=%s id=%s", type, tmdb_id)
 	try:
-		with requests_cache.enabled('tmdb'):
-			response = requests.get(f'https://api.themoviedb.org/3/{type}/{tmdb_id}', 
+		response = httpclient.get(f'https://api.themoviedb.org/3/{type}/{tmdb_id}', 
 			params={'api_key': TMDB_API_KEY})
 		response.raise_for_status()
 	except requests.exceptions.HTTPError as err:
@@ -45,83 +40,102 @@ def fetch_poster(type, tmdb_id):
 	else:
 		return None
 
-connect(TRAKT_DATABASE)
+def fetch_history(start_at):
+	global watched_at
+	for item in Trakt['sync/history'].get(pagination=True, per_page=100, start_at=start_at, extended='full'):
+		if item.action == "watch":
+			if watched_at is None or item.watched_at > watched_at:
+				watched_at = item.watched_at
+			if isinstance(item, Episode):
+				if not item.show.get_key('tmdb') in posters:
+					posters[item.show.get_key('tmdb')] = fetch_poster('tv', item.show.get_key('tmdb'))
+				if posters[item.show.get_key('tmdb')] == None:
+					html = None
+				else:
+					html = '<img src="' + posters[item.show.get_key('tmdb')] + '"/>'
+				yield {
+					"measurement": "watch",
+					"time": item.watched_at.isoformat(),
+					"tags": {
+						"id": item.get_key('trakt'),
+						"show": item.show.title,
+						"show_id": item.show.get_key('trakt'),
+						"season": item.pk[0],
+						"episode": item.pk[1],
+						"type": "episode"
+					},
+					"fields": {
+						"title": item.title,
+						"tmdb_id": item.show.get_key('tmdb'),
+						"duration": item.show.runtime,
+						"poster": posters[item.show.get_key('tmdb')],
+						"poster_html": html,
+						"slug": item.show.get_key('slug'),
+						"url": f"https://trakt.tv/shows/{item.show.get_key('slug')}",
+						"episode_url": f"https://trakt.tv/shows/{item.show.get_key('slug')}/seasons/{item.pk[0]}/episodes/{item.pk[1]}"
+					}
+				}
+			if isinstance(item, Movie):
+				if not item.get_key('tmdb') in posters:
+					posters[item.get_key('tmdb')] = fetch_poster('movie', item.get_key('tmdb'))
+				if posters[item.get_key('tmdb')] == None:
+					html = None
+				else:
+					html = f'<img src="{posters[item.get_key("tmdb")]}"/>'
+				yield {
+					"measurement": "watch",
+					"time": item.watched_at.isoformat(),
+					"tags": {
+						"id": item.get_key('trakt'),
+						"type": "movie"
+					},
+					"fields": {
+						"title": item.title,
+						"tmdb_id": item.get_key('tmdb'),
+						"duration": item.runtime,
+						"poster": posters[item.get_key('tmdb')],
+						"poster_html": html,
+						"slug": item.get_key('slug'),
+						"url": f"https://trakt.tv/movie/{item.get_key('slug')}"
+					}
+				}
 
-Trakt.configuration.defaults.client(
-	id=TRAKT_CLIENT_ID,
-	secret=TRAKT_CLIENT_SECRET
-)
+def main():
+	global watched_at
+	if not TRAKT_CLIENT_ID:
+		logging.error("TRAKT_CLIENT_ID not set in config.py")
+		sys.exit(1)
 
-script_dir = os.path.dirname(__file__)
-oauth_config_file = os.path.join(script_dir, '.trakt.json')
-if not os.path.exists(oauth_config_file):
-	auth = Trakt['oauth'].token_exchange(TRAKT_OAUTH_CODE, 'urn:ietf:wg:oauth:2.0:oob')
-	with open(oauth_config_file, 'w') as outfile:
-		json.dump(auth, outfile)
-else:
-	with open(oauth_config_file) as json_file:
-		auth = json.load(json_file)
+	connect(TRAKT_DATABASE)
 
-Trakt.configuration.defaults.oauth.from_response(auth)
+	Trakt.configuration.defaults.client(
+		id=TRAKT_CLIENT_ID,
+		secret=TRAKT_CLIENT_SECRET
+	)
 
-for item in Trakt['sync/history'].get(pagination=True, per_page=100, start_at=datetime(date.today().year, date.today().month, 1), extended='full'):
-	if item.action == "watch":
-		if isinstance(item, Episode):
-			if not item.show.get_key('tmdb') in posters:
-				posters[item.show.get_key('tmdb')] = fetch_poster('tv', item.show.get_key('tmdb'))
-			if posters[item.show.get_key('tmdb')] == None:
-				html = None
-			else:
-				html = '<img src="' + posters[item.show.get_key('tmdb')] + '"/>'
-			points.append({
-				"measurement": "watch",
-				"time": item.watched_at.isoformat(),
-				"tags": {
-					"id": item.get_key('trakt'),
-					"show": item.show.title,
-					"show_id": item.show.get_key('trakt'),
-					"season": item.pk[0],
-					"episode": item.pk[1],
-					"type": "episode"
-				},
-				"fields": {
-					"title": item.title,
-					"tmdb_id": item.show.get_key('tmdb'),
-					"duration": item.show.runtime,
-					"poster": posters[item.show.get_key('tmdb')],
-					"poster_html": html,
-					"slug": item.show.get_key('slug'),
-					"url": f"https://trakt.tv/shows/{item.show.get_key('slug')}",
-					"episode_url": f"https://trakt.tv/shows/{item.show.get_key('slug')}/seasons/{item.pk[0]}/episodes/{item.pk[1]}"
-				}
-			})
-		if isinstance(item, Movie):
-			if not item.get_key('tmdb') in posters:
-				posters[item.get_key('tmdb')] = fetch_poster('movie', item.get_key('tmdb'))
-			if posters[item.get_key('tmdb')] == None:
-				html = None
-			else:
-				html = f'<img src="{posters[item.get_key("tmdb")]}"/>'
-			points.append({
-				"measurement": "watch",
-				"time": item.watched_at.isoformat(),
-				"tags": {
-					"id": item.get_key('trakt'),
-					"type": "movie"
-				},
-				"fields": {
-					"title": item.title,
-					"tmdb_id": item.get_key('tmdb'),
-					"duration": item.runtime,
-					"poster": posters[item.get_key('tmdb')],
-					"poster_html": html,
-					"slug": item.get_key('slug'),
-					"url": f"https://trakt.tv/movie/{item.get_key('slug')}"
-				}
-			})
+	script_dir = os.path.dirname(__file__)
+	oauth_config_file = os.path.join(script_dir, '.trakt.json')
+	if not os.path.exists(oauth_config_file):
+		auth = Trakt['oauth'].token_exchange(TRAKT_OAUTH_CODE, 'urn:ietf:wg:oauth:2.0:oob')
+		with open(oauth_config_file, 'w') as outfile:
+			json.dump(auth, outfile)
+	else:
+		with open(oauth_config_file) as json_file:
+			auth = json.load(json_file)
+
+	Trakt.configuration.defaults.oauth.from_response(auth)
+
+	# The first run imports the current month, --full the whole history
+	start_at = state.get('trakt', 'watched_at')
+	if start_at:
+		start_at = datetime.fromisoformat(start_at)
+	elif not state.full:
+		start_at = datetime(date.today().year, date.today().month, 1)
+	watched_at = None
+	write_points(fetch_history(start_at))
+	if watched_at is not None:
+		state.set('trakt', 'watched_at', watched_at.isoformat())
 
-		if len(points) >= 5000:
-			write_points(points)
-			points = []
 
-write_points(points)
+if __name__ == "__main__":
+	main()